@@ -1,113 +1,429 @@
-import json
-from flask import Flask, request, jsonify
+import orjson
+import time
+import shutil
+import hashlib
+import logging
+import uuid
+import sqlite3
+import tempfile
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, Flask, Response, request, send_file
 from flask_cors import CORS
+from flask_compress import Compress
 import os
-from utils.folder_processor import FolderProcessor 
-from utils.Store_Embedding import store_embeddings_from_json
-from utils.SearchEngine import CodeSearchEngine
-from utils.Vector_Embedding import CodeEmbeddingModel  # import here
+from utils.faiss_store import vectors_stamp
+# The parsing, embedding and search modules (torch, sentence-transformers,
+# Chroma, NLTK) are imported where they are first used. Ingestion's spawned
+# parse workers re-import this module as __mp_main__, and should not pay for
+# them; for the same reason nothing below starts threads or opens files at
+# import: create_app() does that in the serving process.
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'))
+logger = logging.getLogger(__name__)
+
+def _env_flag(name, default):
+    return os.environ.get(name, default).lower() in ("1", "true", "yes", "on")
+
+api = Blueprint('api', __name__)
+
+# Runtime switches, read once from the environment. Everything below consults
+# this dict (also app.config["FEATURES"]) rather than the environment.
+#   embed_backend   "onnx-int8" | "onnx" | "torch"; see CodeEmbeddingModel.
+#                   Changing it changes the vectors, so re-process projects.
+#   search_backend  "chroma" | "faiss" | "auto" (FAISS when ingest dumped vectors).
+#   store_backend   "chroma" | "faiss"; "faiss" skips Chroma writes at ingest,
+#                   so search_backend must not be "chroma".
+#   response_cache  cache /search bodies under .code_search/.resp_cache.
+#   warm_on_select  load a project's index when it is selected.
+#   top_level_chunks  chunk only top-level definitions (a class, not its
+#                   methods); re-process projects after changing it.
+FEATURES = {
+    "embed_backend": os.environ.get('EMBED_BACKEND', 'onnx-int8'),
+    "search_backend": os.environ.get('SEARCH_BACKEND', 'auto'),
+    "store_backend": os.environ.get('STORE_BACKEND', 'chroma'),
+    "response_cache": _env_flag('RESPONSE_CACHE', '1'),
+    "warm_on_select": _env_flag('WARM_ON_SELECT', '1'),
+    "top_level_chunks": _env_flag('TOP_LEVEL_CHUNKS', '0'),
+}
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 REGISTRY_FILE = os.path.join(BASE_DIR, "project_registry.json")
 ACTIVE_FILE   = os.path.join(BASE_DIR, "active_project.json")
+REGISTRY_DB   = os.path.join(BASE_DIR, "registry.db")
+
+# Ingestion (scan + chunk + embed) runs on this executor, created by
+# create_app(), instead of on the request thread. Threads keep the jobs table
+# and registry in this process; the heavy work is in torch/chroma native code,
+# which releases the GIL.
+executor = None
+registry_lock = threading.Lock()
+
+# Jobs by id for /job_status, oldest first. Only the newest MAX_FINISHED_JOBS
+# finished jobs are kept; running ones are never evicted. _running maps each
+# folder being indexed (by real path) to its job, so a second submit for it
+# reports that job instead of racing it over the same .code_search files.
+MAX_FINISHED_JOBS = 256
+jobs = OrderedDict()
+_running = {}
+jobs_lock = threading.Lock()
+
+# One encoder shared by ingestion jobs and /search; chunks are embedded here and
+# handed to Chroma as vectors.
+_embed_model = None
+_embed_model_lock = threading.Lock()
+
+def get_embedding_model():
+    """Return the process-wide encoder, loading and warming it on first use."""
+    global _embed_model
+    if _embed_model is None:
+        with _embed_model_lock:
+            if _embed_model is None:
+                from utils.Vector_Embedding import CodeEmbeddingModel
+                model = CodeEmbeddingModel(backend=FEATURES["embed_backend"])
+                model.warmup()
+                _embed_model = model
+    return _embed_model
+
+def _read_json(path):
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
+
+def _write_json(path, obj):
+    """Write obj as JSON via a temp file + rename so readers never see a partial file."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, path)
+
+@functools.lru_cache(maxsize=256)
+def _exists_cached(path, epoch):
+    """os.path.exists, shared by every call within the same second (epoch)."""
+    return os.path.exists(path)
+
+def _path_exists(path):
+    return _exists_cached(path, int(time.time()))
+
+# Parsed ACTIVE_FILE, reused while its (st_mtime_ns, st_size) is unchanged.
+# set_active_project writes through, so the common path is a single stat.
+_active_cache = (None, None)
+
+def _active_stamp():
+    st = os.stat(ACTIVE_FILE)
+    return (st.st_mtime_ns, st.st_size)
+
+def _read_active():
+    """Return the active-project record, or None when none has been selected."""
+    global _active_cache
+    try:
+        stamp = _active_stamp()
+    except OSError:
+        return None
+    cached_stamp, active = _active_cache
+    if cached_stamp != stamp:
+        active = _read_json(ACTIVE_FILE)
+        _active_cache = (stamp, active)
+    return active
+
+def _write_active(active):
+    global _active_cache
+    _write_json(ACTIVE_FILE, active)
+    _active_cache = (_active_stamp(), active)
+
+def ojsonify(obj, status=200):
+    """jsonify() equivalent that serializes with orjson."""
+    return Response(orjson.dumps(obj), status=status, mimetype='application/json')
+
+def _open_registry():
+    """Open the project registry, importing project_registry.json into a fresh database."""
+    conn = sqlite3.connect(REGISTRY_DB, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('CREATE TABLE IF NOT EXISTS projects(path TEXT PRIMARY KEY, name TEXT)')
+    empty = conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0] == 0
+    if empty and os.path.exists(REGISTRY_FILE):
+        conn.executemany('INSERT OR IGNORE INTO projects(path, name) VALUES(?, ?)',
+                         [(p['path'], p['name']) for p in _read_json(REGISTRY_FILE)])
+    conn.commit()
+    return conn
+
+# Opened on first use; callers hold registry_lock.
+registry_conn = None
+
+def _registry():
+    global registry_conn
+    if registry_conn is None:
+        registry_conn = _open_registry()
+    return registry_conn
+
+# Search engines per project, keyed by (chroma_path, chunks_path). An entry is
+# rebuilt when code_chunks.json changes on disk, which _run_pipeline does only
+# once re-processing has stored the new vectors, or when the FAISS dump the
+# engine loaded its index from does.
+ENGINE_CACHE_SIZE = 8
+_engines = OrderedDict()
+_engines_lock = threading.Lock()
+
+def _engine_for(chroma_path, chunks_path):
+    stamp = (os.path.getmtime(chunks_path), vectors_stamp(os.path.dirname(chunks_path)))
+    key = (chroma_path, chunks_path)
+    with _engines_lock:
+        cached = _engines.get(key)
+        if cached is not None and cached[0] == stamp:
+            _engines.move_to_end(key)
+            return cached[1]
+
+    from utils.SearchEngine import CodeSearchEngine
+    from utils.chroma_client import get_client
+    engine = CodeSearchEngine(
+        chroma_client=get_client(chroma_path),
+        collection_name="code_embeddings",
+        embedding_model=get_embedding_model(),
+        chunks_filepath=chunks_path,
+        search_backend=FEATURES["search_backend"],
+        index_dir=os.path.dirname(chunks_path)
+    )
+    with _engines_lock:
+        _engines[key] = (stamp, engine)
+        _engines.move_to_end(key)
+        while len(_engines) > ENGINE_CACHE_SIZE:
+            _engines.popitem(last=False)
+    return engine
 
-@app.route('/process_path', methods=['POST'])
+# /search response bodies are cached on disk per project and served with
+# send_file, so repeated queries go out via sendfile(2) under gunicorn.
+RESP_CACHE_DIR = ".resp_cache"
+# Per-project chunk cache, keyed by file content (see CodeChunker)
+AST_CACHE_DIR = "ast-cache"
+# Per-project embeddings keyed by chunk content (see embed_with_cache)
+EMBEDDING_CACHE_FILE = "embedding_cache.sqlite"
+
+def _resp_cache_path(storage_dir, active_path, query, k, chunks_mtime):
+    key = f"{active_path}\0{query}\0{k}\0{chunks_mtime}".encode()
+    return os.path.join(storage_dir, RESP_CACHE_DIR, hashlib.blake2b(key).hexdigest()[:16] + ".json")
+
+def _write_resp_cache(cache_path, body):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(body)
+    os.replace(tmp_path, cache_path)
+
+def _warm_project(project_path):
+    """Open and exercise a project's search engine ahead of its first query."""
+    chunks_path = os.path.join(project_path, ".code_search", "code_chunks.json")
+    chroma_path = os.path.join(project_path, ".code_search", "chroma_db")
+    if not os.path.exists(chunks_path):
+        return
+    try:
+        _engine_for(chroma_path, chunks_path).warmup()
+    except Exception:
+        logger.exception("Warming %s failed", project_path)
+
+def _run_pipeline(folder_path):
+    """Scan, chunk and embed a folder. Runs on the ingestion executor."""
+    from utils.folder_processor import FolderProcessor
+    from utils.Store_Embedding import store_embeddings_from_json
+    storage_dir   = os.path.join(folder_path, ".code_search")
+    os.makedirs(storage_dir, exist_ok=True)
+
+    # Re-indexing only parses files whose content changed since the last run
+    processor = FolderProcessor(chunk_cache_dir=os.path.join(storage_dir, AST_CACHE_DIR),
+                                top_level_only=FEATURES["top_level_chunks"])
+    processor.process_folder_parallel(folder_path)
+
+    json_file_path = os.path.join(storage_dir, "code_chunks.json")
+    chroma_path    = os.path.join(storage_dir, "chroma_db")
+
+    # The new chunks are embedded from a temp file and renamed over
+    # code_chunks.json last. Its mtime keys the engine and response caches,
+    # so it must not change before the vectors it describes are stored.
+    fd, pending_path = tempfile.mkstemp(dir=storage_dir, prefix="code_chunks.", suffix=".tmp")
+    os.close(fd)
+    processor.save_chunks_to_file(pending_path)
+    try:
+        store_embeddings_from_json(pending_path, chroma_path=chroma_path, batch_size=1024,
+                                   embedding_model=get_embedding_model(),
+                                   store_backend=FEATURES["store_backend"],
+                                   embedding_cache_path=os.path.join(storage_dir, EMBEDDING_CACHE_FILE))
+    except BaseException:
+        os.remove(pending_path)
+        raise
+    os.replace(pending_path, json_file_path)
+    # Drop cached /search responses only now that the vectors are stored: one
+    # cached while embedding ran would be keyed by the new chunks file but
+    # hold old or missing vector hits.
+    shutil.rmtree(os.path.join(storage_dir, RESP_CACHE_DIR), ignore_errors=True)
+    return folder_path
+
+def _register_project(folder_path):
+    project_name = os.path.basename(folder_path)
+    with registry_lock:
+        conn = _registry()
+        conn.execute('INSERT OR IGNORE INTO projects(path, name) VALUES(?, ?)', (folder_path, project_name))
+        conn.commit()
+
+def _evict_finished_jobs():
+    # Caller holds jobs_lock
+    finished = [jid for jid, job in jobs.items() if job["status"] != "running"]
+    for jid in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del jobs[jid]
+
+def _finish_job(jid, key, fut):
+    job = jobs[jid]
+    try:
+        folder_path = fut.result()
+        _register_project(folder_path)
+    except Exception as e:
+        logger.exception("Job %s failed for %s", jid, job["path"])
+        status, message = "failed", f"Server error: {str(e)}"
+    else:
+        logger.info("Job %s processed %s", jid, folder_path)
+        status, message = "done", f"Processed path: {folder_path}"
+    with jobs_lock:
+        job["message"] = message
+        job["status"] = status
+        _running.pop(key, None)
+        _evict_finished_jobs()
+
+@api.route('/process_path', methods=['POST'])
 def process_path():
     try:
         data = request.get_json()
         if not data or "path" not in data:
-            return jsonify({"message": "Invalid request, 'path' is required"}), 400
+            return ojsonify({"message": "Invalid request, 'path' is required"}, 400)
 
         folder_path = data["path"]
-        if not os.path.exists(folder_path):
-            return jsonify({"message": "Invalid path. Folder does not exist."}), 400
-        
-        processor = FolderProcessor()
-        processor.process_folder(folder_path)
-
-        storage_dir   = os.path.join(folder_path, ".code_search")
-        os.makedirs(storage_dir, exist_ok=True)
-        json_file_path = os.path.join(storage_dir, "code_chunks.json")
-        chroma_path    = os.path.join(storage_dir, "chroma_db")
-
-        processor.save_chunks_to_file(json_file_path)
-        store_embeddings_from_json(json_file_path, chroma_path=chroma_path)
-
-        # update registry
-        project_name = os.path.basename(folder_path)
-        entry = {"name": project_name, "path": folder_path}
-        projects = []
-        if os.path.exists(REGISTRY_FILE):
-            with open(REGISTRY_FILE, 'r') as f:
-                projects = json.load(f)
-        if not any(p['path'] == folder_path for p in projects):
-            projects.append(entry)
-            with open(REGISTRY_FILE, 'w') as f:
-                json.dump(projects, f, indent=2)
-
-        return jsonify({"message": f"Processing path: {folder_path}"}), 200
+        if not _path_exists(folder_path):
+            return ojsonify({"message": "Invalid path. Folder does not exist."}, 400)
+
+        key = os.path.realpath(folder_path)
+        with jobs_lock:
+            jid = _running.get(key)
+            if jid is not None:
+                logger.debug("Job %s already running for %s", jid, folder_path)
+                return ojsonify({"job_id": jid, "message": jobs[jid]["message"]}, 202)
+            jid = uuid.uuid4().hex
+            jobs[jid] = {"status": "running", "path": folder_path, "message": f"Processing path: {folder_path}"}
+            _running[key] = jid
+        logger.debug("Job %s queued for %s", jid, folder_path)
+        try:
+            fut = executor.submit(_run_pipeline, folder_path)
+        except Exception:
+            with jobs_lock:
+                del jobs[jid]
+                _running.pop(key, None)
+            raise
+        fut.add_done_callback(functools.partial(_finish_job, jid, key))
+
+        return ojsonify({"job_id": jid, "message": f"Processing path: {folder_path}"}, 202)
 
     except Exception as e:
-        return jsonify({"message": f"Server error: {str(e)}"}), 500
+        return ojsonify({"message": f"Server error: {str(e)}"}, 500)
+
+@api.route('/job_status/<jid>', methods=['GET'])
+def job_status(jid):
+    job = jobs.get(jid)
+    if job is None:
+        return ojsonify({"message": "Unknown job id"}, 404)
+    return ojsonify({"job_id": jid, **job})
 
-@app.route('/get_projects', methods=['GET'])
+@api.route('/get_projects', methods=['GET'])
 def get_projects():
     try:
-        projects = []
-        if os.path.exists(REGISTRY_FILE):
-            with open(REGISTRY_FILE, "r") as f:
-                projects = json.load(f)
-        return jsonify({"projects": projects})
+        with registry_lock:
+            rows = _registry().execute('SELECT name, path FROM projects ORDER BY rowid').fetchall()
+        projects = [{"name": name, "path": path} for name, path in rows]
+        return ojsonify({"projects": projects})
     except Exception as e:
-        return jsonify({"message": f"Error loading project list: {str(e)}"}), 500
+        return ojsonify({"message": f"Error loading project list: {str(e)}"}, 500)
 
-@app.route('/set_active_project', methods=['POST'])
+@api.route('/set_active_project', methods=['POST'])
 def set_active_project():
     try:
         data = request.get_json()
         selected_path = data.get("path")
         if not selected_path or not os.path.exists(selected_path):
-            return jsonify({"message": "Invalid project path"}), 400
+            return ojsonify({"message": "Invalid project path"}, 400)
 
-        with open(ACTIVE_FILE, "w") as f:
-            json.dump({"path": selected_path}, f)
+        _write_active({"path": selected_path})
+        if FEATURES["warm_on_select"]:
+            # Load the index while the user is typing their first query.
+            threading.Thread(target=_warm_project, args=(selected_path,), daemon=True).start()
 
-        return jsonify({"message": "Project selected successfully."}), 200
+        return ojsonify({"message": "Project selected successfully."}, 200)
     except Exception as e:
-        return jsonify({"message": f"Server error: {str(e)}"}), 500
+        return ojsonify({"message": f"Server error: {str(e)}"}, 500)
 
-@app.route('/search', methods=['POST'])
+@api.route('/search', methods=['POST'])
 def search():
     try:
         data = request.get_json()
         query = data.get("query", "").strip()
         if not query:
-            return jsonify({"message": "Query is required"}), 400
+            return ojsonify({"message": "Query is required"}, 400)
 
 
-        if not os.path.exists(ACTIVE_FILE):
-            return jsonify({"message": "No active project selected"}), 400
-        with open(ACTIVE_FILE, "r") as f:
-            active = json.load(f)
+        active = _read_active()
+        if active is None:
+            return ojsonify({"message": "No active project selected"}, 400)
         path = active.get("path")
-        if not path or not os.path.exists(path):
-            return jsonify({"message": "Invalid active project path"}), 400
+        if not path or not _path_exists(path):
+            return ojsonify({"message": "Invalid active project path"}, 400)
 
-        # Get chunk file path
+        # Get chunk file and vector store paths
         chunks_path = os.path.join(path, ".code_search", "code_chunks.json")
-        if not os.path.exists(chunks_path):
-            return jsonify({"message": "Code chunks not found. Please process the path first."}), 404
+        chroma_path = os.path.join(path, ".code_search", "chroma_db")
+        if not _path_exists(chunks_path):
+            return ojsonify({"message": "Code chunks not found. Please process the path first."}, 404)
 
-        search_engine = CodeSearchEngine(chunks_filepath=chunks_path)
-        results = search_engine.combined_search(query, k=10)
+        k = 10
+        cache_path = None
+        if FEATURES["response_cache"]:
+            cache_path = _resp_cache_path(os.path.dirname(chunks_path), path, query, k,
+                                          os.stat(chunks_path).st_mtime_ns)
+            if os.path.exists(cache_path):
+                return send_file(cache_path, mimetype='application/json', conditional=True)
 
-        return jsonify({"results": results}), 200
+        search_engine = _engine_for(chroma_path, chunks_path)
+        results = search_engine.combined_search(query, k=k)
+
+        body = orjson.dumps({"results": results})
+        if cache_path is not None:
+            try:
+                _write_resp_cache(cache_path, body)
+            except OSError:
+                logger.warning("Could not cache search response at %s", cache_path)
+        return Response(body, status=200, mimetype='application/json')
 
     except Exception as e:
-        return jsonify({"message": f"Search error: {str(e)}"}), 500
+        return ojsonify({"message": f"Search error: {str(e)}"}, 500)
+
+def create_app():
+    """Build the Flask app and start the serving process's background work."""
+    global executor
+    app = Flask(__name__)
+    app.config["FEATURES"] = FEATURES
+    app.register_blueprint(api)
+
+    CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
+
+    # Compress JSON responses when the client accepts it. Cached /search hits are
+    # sent with send_file and skipped, so they keep the sendfile path.
+    app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+    app.config["COMPRESS_MIN_SIZE"] = 512
+    app.config["COMPRESS_LEVEL"] = 4
+    app.config["COMPRESS_BR_LEVEL"] = 4
+    Compress(app)
+
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=2)
+    # Load the model in the background at startup so the first query isn't cold.
+    threading.Thread(target=get_embedding_model, daemon=True).start()
+    return app
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Development server only; see wsgi.py for the production launch command.
+    # The reloader would start a second process and a second model warmup.
+    create_app().run(debug=os.environ.get("FLASK_DEBUG") == "1", use_reloader=False, threaded=True)
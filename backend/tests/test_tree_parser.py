@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import TreeParser
+from utils.TreeParser import CodeChunker
+
+NESTED_PYTHON = '''import os
+
+@decorator
+def outer(a):
+    def inner():
+        class Local:
+            pass
+    return inner
+
+class Outer:
+    @property
+    def method(self):
+        def helper():
+            pass
+        return 1
+
+    class Inner:
+        def method(self):
+            pass
+'''
+
+
+@pytest.mark.skipif(not TreeParser.TREE_SITTER_AVAILABLE, reason="tree-sitter not installed")
+def test_tree_sitter_skips_definitions_nested_in_functions(monkeypatch):
+    # Fail loudly if the ast fallback would be used instead
+    monkeypatch.setattr(CodeChunker, '_python_definitions',
+                        lambda self, tree: pytest.fail("ast fallback used"))
+
+    chunks = CodeChunker().process_code('nested.py', NESTED_PYTHON)
+
+    definitions = [(chunk.chunk_id.split('_')[1], chunk.start_line, chunk.end_line)
+                   for chunk in chunks if '_global_' not in chunk.chunk_id]
+    assert definitions == [
+        ('function', 3, 8),   # outer, with its decorator; inner and Local stay in it
+        ('class', 10, 19),    # Outer
+        ('function', 11, 15), # Outer.method; helper stays in it
+        ('class', 17, 19),    # Outer.Inner
+        ('function', 18, 19), # Outer.Inner.method
+    ]
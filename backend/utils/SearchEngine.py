@@ -1,22 +1,97 @@
-import json
 import re
+import logging
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Set
-import chromadb
-from Vector_Embedding import CodeEmbeddingModel
+from utils.chroma_client import get_client
+from utils.Vector_Embedding import CodeEmbeddingModel
+from utils.Store_Embedding import HNSW_CONFIG, iter_chunks
+from utils.faiss_store import FaissIndex
 import nltk
 from nltk.corpus import wordnet
 
-nltk.download('wordnet', quiet=True)
-nltk.download('omw-1.4', quiet=True)
+# For matching all synonym terms in one pass (optional; regex otherwise)
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
 
+logger = logging.getLogger(__name__)
+
+# Words for the keyword/synonym candidate index.
+WORD_RE = re.compile(r'\w+')
+
+
+# Query embeddings kept per engine, so a repeated query skips the model.
+QUERY_EMBEDDING_CACHE_SIZE = 256
+
+# Shared by every engine. combined_search hands its two model-bound passes to
+# one helper thread and runs the text passes on the calling thread, so each
+# query takes one pool thread: size the pool to the server's request threads
+# (8 in wsgi.py's launch command) so concurrent queries don't queue.
+SEARCH_POOL_THREADS = 8
+_search_pool = ThreadPoolExecutor(max_workers=SEARCH_POOL_THREADS, thread_name_prefix="search")
+
+# WordNet data for synonym expansion, checked (and downloaded if missing) on
+# first use rather than at import: nltk.download fetches the remote index
+# every time it is called, even when the data is already installed.
+_WORDNET_RESOURCES = (('corpora/wordnet', 'wordnet'), ('corpora/omw-1.4', 'omw-1.4'))
+_wordnet_ready = False
+_wordnet_lock = threading.Lock()
+
+def _ensure_wordnet() -> None:
+    global _wordnet_ready
+    if not _wordnet_ready:
+        with _wordnet_lock:
+            if not _wordnet_ready:
+                for resource, package in _WORDNET_RESOURCES:
+                    try:
+                        nltk.data.find(resource)
+                    except LookupError:
+                        nltk.download(package, quiet=True)
+                _wordnet_ready = True
+
+@lru_cache(maxsize=2048)
+def _expand_word(word: str) -> frozenset:
+    """WordNet lemma names for word; cached, as queries repeat within a session."""
+    _ensure_wordnet()
+    return frozenset(lemma.name() for syn in wordnet.synsets(word) for lemma in syn.lemmas())
+
+@lru_cache(maxsize=256)
+def _term_matcher(terms: frozenset):
+    """Predicate telling whether a text contains any of terms, ignoring case.
+
+    ASCII terms go into an Aho-Corasick automaton matched against lower-cased
+    text, so the scan costs the same however many synonyms a query expands to.
+    Other terms (or no pyahocorasick) use one case-insensitive alternation.
+    Cached per term set, as queries repeat within a session.
+    """
+    if AHOCORASICK_AVAILABLE and terms and all(term.isascii() for term in terms):
+        automaton = ahocorasick.Automaton()
+        for term in terms:
+            automaton.add_word(term.lower(), term)
+        automaton.make_automaton()
+        return lambda text: next(automaton.iter(text.lower()), None) is not None
+    pattern = re.compile("|".join(map(re.escape, terms)), re.IGNORECASE)
+    return lambda text: pattern.search(text) is not None
 
 class CodeSearchEngine:
-    def __init__(self, chroma_path=None, collection_name="code_chunks", embedding_model=None, chunks_filepath: str = None):
-        if chroma_path is None:
-            chroma_path = "./chromadb_store"  # fallback default
+    def __init__(self, chroma_path=None, collection_name="code_chunks", embedding_model=None, chunks_filepath: str = None,
+                 chroma_client=None, search_backend: str = "chroma", index_dir: str = None):
+        if chroma_client is None:
+            if chroma_path is None:
+                chroma_path = "./chromadb_store"  # fallback default
+            chroma_client = get_client(chroma_path)
 
-        chroma_client = chromadb.PersistentClient(path=chroma_path)
-        self.collection = chroma_client.get_or_create_collection(name=collection_name)
+        # Same configuration as Store_Embedding, so whichever side creates the
+        # collection builds the same HNSW index
+        self.collection = chroma_client.get_or_create_collection(name=collection_name, embedding_function=None,
+                                                                 configuration={"hnsw": HNSW_CONFIG})
 
         if embedding_model is None:
             self.embedding_model = CodeEmbeddingModel()
@@ -27,24 +102,137 @@ class CodeSearchEngine:
         self.code_chunks = []
         if chunks_filepath:
             self.code_chunks = self._load_chunks(chunks_filepath)
+        # Lower-cased (code, file_path) per chunk and a word -> chunk positions
+        # index over them, built on first use by keyword and synonym search
+        self._lowered_chunks = None
+        self._word_index = None
+        # The index's words, joined by newlines, and each one's offset in the
+        # joined string; see _words_containing
+        self._vocabulary = None
+        # keyword and synonym search run concurrently; build the index once
+        self._index_lock = threading.Lock()
+        # query -> embedding, most recently used last; see _embed_query
+        self._query_embeddings = OrderedDict()
+        self._query_embeddings_model = self.embedding_model
+        self._query_embeddings_lock = threading.Lock()
+
+        # search_backend is "chroma", "faiss" or "auto"; FAISS needs the vectors
+        # dumped at ingest in index_dir and falls back to Chroma without them.
+        # Large projects get an in-process HNSW index (see faiss_store), so
+        # "auto" no longer hands them to Chroma.
+        self.faiss_index = None
+        if search_backend in ("faiss", "auto") and index_dir:
+            self.faiss_index = FaissIndex.load(index_dir)
+
+    def warmup(self):
+        """Run one tiny vector query so the index is loaded before the first real
+        search, and build the keyword word index."""
+        self.vector_search("warmup", k=1)
+        self._words()
+
+    def _embed_query(self, query: str):
+        """Normalized embedding of query, from the LRU cache when seen before.
+
+        The cache is dropped if embedding_model has been replaced since it was filled.
+        """
+        with self._query_embeddings_lock:
+            if self._query_embeddings_model is not self.embedding_model:
+                self._query_embeddings.clear()
+                self._query_embeddings_model = self.embedding_model
+            embedding = self._query_embeddings.get(query)
+            if embedding is not None:
+                self._query_embeddings.move_to_end(query)
+                return embedding
+
+        embedding = self.embedding_model.generate_embeddings([query], normalize=True)
+        with self._query_embeddings_lock:
+            self._query_embeddings[query] = embedding
+            while len(self._query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_embeddings.popitem(last=False)
+        return embedding
+
+    def _query(self, query_embedding, include, k):
+        if self.faiss_index is not None:
+            return self.faiss_index.query(query_embedding, n_results=k, include=include)
+        return self.collection.query(query_embedding, include=include, n_results=k)
 
     def _load_chunks(self, path: str) -> List[Dict]:
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return list(iter_chunks(path))
         except Exception as e:
             print(f"Error loading chunks: {e}")
             return []
 
+    def _lowered(self) -> List[tuple]:
+        if self._lowered_chunks is None:
+            with self._index_lock:
+                if self._lowered_chunks is None:
+                    self._lowered_chunks = [(chunk.get("code", "").lower(), chunk.get("file_path", "").lower())
+                                            for chunk in self.code_chunks]
+        return self._lowered_chunks
+
+    def _words(self) -> Dict[str, Set[int]]:
+        if self._word_index is None:
+            lowered = self._lowered()
+            with self._index_lock:
+                if self._word_index is None:
+                    index = {}
+                    for i, (code, file_path) in enumerate(lowered):
+                        for word in set(WORD_RE.findall(code)) | set(WORD_RE.findall(file_path)):
+                            index.setdefault(word, set()).add(i)
+                    words = list(index)
+                    starts = list(accumulate((len(word) + 1 for word in words[:-1]), initial=0))
+                    self._vocabulary = (words, "\n".join(words), starts)
+                    self._word_index = index
+        return self._word_index
+
+    def _candidates(self, needle: str) -> Optional[Set[int]]:
+        """Positions of the chunks that can contain needle (lower-cased ASCII).
+
+        Every run of word characters in needle lies inside one word of any text
+        containing it, so only chunks with such words are candidates. Returns
+        None when needle has no word characters and every chunk must be scanned.
+        """
+        runs = WORD_RE.findall(needle)
+        if not runs:
+            return None
+        index = self._words()
+        containing = self._words_containing(runs)
+        candidates = None
+        for run in runs:
+            matches = set().union(*(index[word] for word in containing[run]))
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                break
+        return candidates
+
+    def _words_containing(self, runs: List[str]) -> Dict[str, Set[str]]:
+        """The indexed words containing each run (keyword search matches substrings).
+
+        str.find over the joined vocabulary skips from hit to hit in C, so the
+        Python-level work is per matching word rather than per indexed word.
+        Runs hold no newline, so a hit never spans two words.
+        """
+        words, text, starts = self._vocabulary
+        found = {run: set() for run in runs}
+        for run, matches in found.items():
+            at = text.find(run)
+            while at != -1:
+                word = bisect_right(starts, at) - 1
+                matches.add(words[word])
+                # Later hits in the same word add nothing
+                at = text.find(run, starts[word + 1]) if word + 1 < len(starts) else -1
+        return found
+
     def vector_search(self, query: str, k: int = 10) -> Dict[str, Dict]:
         if not query or not isinstance(query, str):
             return {}
 
         try:
-            print("try vector")
-            query_embedding = self.embedding_model.generate_embeddings([query])
+            logger.debug("vector search for %r", query)
+            query_embedding = self._embed_query(query)
             # Change 'k' to 'n_results' as per ChromaDB API
-            results = self.collection.query(query_embedding, include=["metadatas", "documents"], n_results=k)
+            results = self._query(query_embedding, ["metadatas", "documents"], k)
         except Exception as e:
             print(f"Vector search error: {e}")
             return {}
@@ -67,18 +255,25 @@ class CodeSearchEngine:
 
     def keyword_search(self, query: str) -> Dict[str, Dict]:
         if not query or not isinstance(query, str):
-            print("i tried key")
+            logger.debug("keyword search skipped: empty or non-string query")
             return {}
-        print("keyyy")
-        pattern = re.compile(re.escape(query), re.IGNORECASE)
+        logger.debug("keyword search for %r", query)
         combined = {}
-        for chunk in self.code_chunks:
-            code = chunk.get("code", "")
-            file_path = chunk.get("file_path", "")
-            code_matches = len(pattern.findall(code))
-            file_matches = len(pattern.findall(file_path))
-            total_matches = code_matches + file_matches
+        if query.isascii():
+            # A literal, case-insensitive count is str.count over lower-cased text,
+            # needed only for the chunks the word index leaves as candidates
+            needle = query.lower()
+            lowered = self._lowered()
+            positions = self._candidates(needle)
+            positions = range(len(lowered)) if positions is None else sorted(positions)
+            counts = ((i, lowered[i][0].count(needle) + lowered[i][1].count(needle)) for i in positions)
+        else:
+            pattern = re.compile(re.escape(query), re.IGNORECASE)
+            counts = ((i, len(pattern.findall(chunk.get("code", ""))) + len(pattern.findall(chunk.get("file_path", ""))))
+                      for i, chunk in enumerate(self.code_chunks))
+        for i, total_matches in counts:
             if total_matches > 0:
+                chunk = self.code_chunks[i]
                 chunk_id = chunk.get("chunk_id")
                 bonus_score = min(0.1 * total_matches, 1.0)  # Dynamic score up to 1.0
                 combined[chunk_id] = {
@@ -92,17 +287,26 @@ class CodeSearchEngine:
         if not query or not isinstance(query, str):
             return {}
 
-        expanded_terms = set(query.split())
-        for word in query.split():
-            for syn in wordnet.synsets(word):
-                expanded_terms.update(lemma.name() for lemma in syn.lemmas())
+        words = query.split()
+        expanded_terms = set(words).union(*map(_expand_word, words))
         
-        pattern = re.compile("|".join(map(re.escape, expanded_terms)), re.IGNORECASE)
+        contains_term = _term_matcher(frozenset(expanded_terms))
+        # Only chunks holding a word that could contain one of the terms are searched
+        # (no terms, as for a blank query, leaves an empty pattern matching everything)
+        positions = set() if expanded_terms else None
+        for term in expanded_terms:
+            term_positions = self._candidates(term.lower()) if term.isascii() else None
+            if term_positions is None:
+                positions = None
+                break
+            positions |= term_positions
+        chunks = self.code_chunks if positions is None else [self.code_chunks[i] for i in sorted(positions)]
+
         combined = {}
-        for chunk in self.code_chunks:
+        for chunk in chunks:
             code = chunk.get("code", "")
             file_path = chunk.get("file_path", "")
-            if pattern.search(code) or pattern.search(file_path):
+            if contains_term(code) or contains_term(file_path):
                 chunk_id = chunk.get("chunk_id")
                 combined[chunk_id] = {
                     "score": 0.3,  # Fixed score per match
@@ -127,9 +331,9 @@ class CodeSearchEngine:
             enriched_query = query
 
         try:
-            query_embedding = self.embedding_model.generate_embeddings([enriched_query])
+            query_embedding = self._embed_query(enriched_query)
             # Changed 'k' to 'n_results' as per ChromaDB API
-            results = self.collection.query(query_embedding, include=["metadatas", "documents"], n_results=k)
+            results = self._query(query_embedding, ["metadatas", "documents"], k)
         except Exception as e:
             print(f"LLM search error: {e}")
             return {}
@@ -158,10 +362,13 @@ class CodeSearchEngine:
         synonym_weight: float = 0.3,
         llm_weight: float = 0.9
     ) -> List[Dict]:
-        vector_results = self.vector_search(query, k)
+        # The passes are independent and only read engine state. The vector and
+        # LLM passes wait on the model and index, so they run on a helper while
+        # this thread does the text passes; merging below keeps the same order.
+        semantic_future = _search_pool.submit(lambda: (self.vector_search(query, k), self.llm_search(query, k)))
         keyword_results = self.keyword_search(query)
         synonym_results = self.synonym_search(query)
-        llm_results = self.llm_search(query, k)
+        vector_results, llm_results = semantic_future.result()
 
         combined_scores = {}
 
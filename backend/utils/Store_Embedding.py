@@ -1,11 +1,72 @@
-import chromadb
-import uuid
-import json
+import orjson
 import os
-from Vector_Embedding import CodeEmbeddingModel  # Import the model wrapper
-
-def store_embeddings_from_json(json_file_path, chroma_path=None):
-    """Read chunks from JSON file created by folder_processor.py and store in ChromaDB."""
+import logging
+import sys
+import threading
+import numpy as np
+from utils.Vector_Embedding import CodeEmbeddingModel  # Import the model wrapper
+from utils.chroma_client import get_client
+from utils.faiss_store import FaissStore, remove_vectors, save_vectors
+from utils.embedding_cache import embed_with_cache, model_key
+
+logger = logging.getLogger(__name__)
+
+# HNSW settings for a newly created collection (an existing one keeps its own).
+# Wider graphs and a deeper build search than Chroma's defaults (16 and 100)
+# raise recall for a one-off cost at ingestion. The space stays L2: vectors are
+# unit length, so it ranks like cosine, and search scores by inverse L2 distance.
+HNSW_CONFIG = {"ef_construction": 200, "max_neighbors": 32}
+
+# Encoder for callers that don't pass one, loaded on first use and kept for
+# the life of the process rather than reloaded by every call.
+_EMB_MODEL = None
+_emb_model_lock = threading.Lock()
+
+def _get_model():
+    global _EMB_MODEL
+    if _EMB_MODEL is None:
+        with _emb_model_lock:
+            if _EMB_MODEL is None:
+                _EMB_MODEL = CodeEmbeddingModel()
+    return _EMB_MODEL
+
+def iter_chunks(json_file_path):
+    """Yield chunks from a code_chunks.json file one at a time.
+
+    The file is newline-delimited JSON (one chunk per line). Files written
+    before the switch are a single JSON array and are still accepted.
+    """
+    with open(json_file_path, 'rb') as f:
+        head = f.read(1)
+        while head.isspace():
+            head = f.read(1)
+        f.seek(0)
+        if head == b'[':
+            yield from orjson.loads(f.read())
+            return
+        for line in f:
+            if line.strip():
+                yield orjson.loads(line)
+
+def store_embeddings_from_json(json_file_path, chroma_path=None, batch_size=1024, embedding_model=None,
+                               store_backend="chroma", embedding_cache_path=None):
+    """Read chunks from JSON file created by folder_processor.py and store in ChromaDB.
+
+    New chunks are written with one ``collection.upsert`` per ``batch_size`` chunks
+    rather than one call per chunk. Embeddings are computed here with
+    ``embedding_model`` (a shared ``CodeEmbeddingModel`` if the caller has one)
+    and passed to Chroma precomputed; chunks already stored with the same code
+    by the same model (``embedding_model`` metadata, see ``model_key``) reuse
+    their stored vectors instead. Rows for chunks this run did not produce are
+    deleted, so the collection holds exactly the chunks in the JSON file.
+
+    With ``store_backend="faiss"`` Chroma is not written at all: every chunk is
+    embedded and saved with a ``FaissStore`` next to the JSON file, for search
+    with ``search_backend="faiss"``.
+
+    ``embedding_cache_path`` names a SQLite file of embeddings by content (see
+    ``embed_with_cache``); with it, code seen before is never embedded again.
+    """
 
     # Determine chroma storage path
     if chroma_path is None:
@@ -17,75 +78,144 @@ def store_embeddings_from_json(json_file_path, chroma_path=None):
     else:
         os.makedirs(chroma_path, exist_ok=True)  # Ensure the directory exists
 
-    chroma_client = chromadb.PersistentClient(path=chroma_path)
-    collection = chroma_client.get_or_create_collection(name="code_embeddings")
-
     # Initialize embedding model
-    embedding_model = CodeEmbeddingModel()
+    if embedding_model is None:
+        embedding_model = _get_model()
+    model = model_key(embedding_model)
 
-    # Load chunks from JSON file
-    try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            chunks = json.load(f)
+    def embed(texts):
+        if embedding_cache_path:
+            return embed_with_cache(embedding_cache_path, embedding_model, texts, batch_size=64)
+        return embedding_model.generate_embeddings(texts, batch_size=64, normalize=True)
+
+    # Stream chunks from the JSON file, keeping only what is embedded and stored
+    cleaned_chunks = []
+    metadata_list = []
+    loaded = 0
 
-        print(f"Loaded {len(chunks)} chunks from {json_file_path}")
+    try:
+        for chunk in iter_chunks(json_file_path):
+            loaded += 1
+            # Paths and languages repeat across a file's chunks; intern them so
+            # the metadata shares one string per value instead of one per chunk
+            metadata = {
+                "chunk_id": chunk.get("chunk_id", "N/A"),
+                "file_path": sys.intern(chunk.get("file_path", "N/A")),
+                "line_numbers": f"{chunk.get('start_line', 'N/A')}-{chunk.get('end_line', 'N/A')}",
+                "language": sys.intern(chunk.get("language", "N/A")),
+                "embedding_model": model
+            }
+
+            code = chunk.get("code", "").strip()
+            if code:
+                cleaned_chunks.append(code)
+                metadata_list.append(metadata)
+
+        print(f"Loaded {loaded} chunks from {json_file_path}")
     except FileNotFoundError:
         print(f"Error: JSON file not found at {json_file_path}")
         return
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         print(f"Error: Invalid JSON format in {json_file_path}")
         return
 
-    # Prepare data for embedding
-    cleaned_chunks = []
-    metadata_list = []
-
-    for chunk in chunks:
-        metadata = {
-            "chunk_id": chunk.get("chunk_id", "N/A"),
-            "file_path": chunk.get("file_path", "N/A"),
-            "line_numbers": f"{chunk.get('start_line', 'N/A')}-{chunk.get('end_line', 'N/A')}",
-            "language": chunk.get("language", "N/A")
-        }
-
-        code = chunk.get("code", "").strip()
-        if code:
-            cleaned_chunks.append(code)
-            metadata_list.append(metadata)
-
     if not cleaned_chunks:
         print("Error: No valid code chunks found in the JSON file.")
+        # Nothing to dump, so the FAISS backend must not keep serving an earlier run's vectors
+        remove_vectors(os.path.dirname(json_file_path))
         return
 
-    # Generate vector embeddings
-    vector_embeddings = embedding_model.generate_embeddings(cleaned_chunks)
-
-    # Fetch existing metadata to prevent duplicates
-    existing_metadata = collection.get(include=['metadatas'])['metadatas'] or []
-    existing_chunk_ids = {meta["chunk_id"] for meta in existing_metadata if isinstance(meta, dict) and "chunk_id" in meta}
-
-    print(f"Existing chunk IDs in DB before insertion: {len(existing_chunk_ids)}")
-
-    new_chunks_added = 0
+    if store_backend == "faiss":
+        store = FaissStore(os.path.dirname(json_file_path))
+        store.add(embed(cleaned_chunks), metadata_list)
+        store.save()
+        print(f"Stored {len(store)} code chunks in the FAISS index.")
+        return
 
-    for metadata, embedding in zip(metadata_list, vector_embeddings):
+    chroma_client = get_client(chroma_path)
+    collection = chroma_client.get_or_create_collection(name="code_embeddings", embedding_function=None,
+                                                        configuration={"hnsw": HNSW_CONFIG})
+
+    # Look up only this run's chunk IDs before embedding anything, in batches so
+    # the $in filter stays within SQLite's parameter limit. A chunk whose stored
+    # document is unchanged, and was embedded by this model, keeps its stored
+    # vector and is not embedded again. Only rows stored under their chunk ID
+    # count: older rows with other IDs are replaced and deleted below.
+    candidate_ids = [metadata["chunk_id"] for metadata in metadata_list]
+    stored = {}
+    for start in range(0, len(candidate_ids), batch_size):
+        existing = collection.get(where={"chunk_id": {"$in": candidate_ids[start:start + batch_size]}},
+                                  include=['metadatas', 'documents', 'embeddings'])
+        for row_id, meta, document, embedding in zip(
+                existing['ids'], existing['metadatas'] or [], existing['documents'] or [],
+                existing['embeddings'] if existing['embeddings'] is not None else []):
+            if isinstance(meta, dict) and meta.get("chunk_id") == row_id:
+                stored[row_id] = (document, embedding, meta.get("embedding_model"))
+
+    print(f"Existing chunk IDs in DB before insertion: {len(stored)}")
+
+    ids, documents, keep, metadatas = [], [], [], []
+    reused = {}
+
+    for i, (metadata, code) in enumerate(zip(metadata_list, cleaned_chunks)):
         chunk_id = metadata["chunk_id"]
+        previous = stored.get(chunk_id)
 
-        if chunk_id in existing_chunk_ids:
-            print(f"Skipping duplicate chunk: {chunk_id}")
+        if previous is not None and previous[0] == code and previous[2] == model:
+            reused[i] = previous[1]
             continue
 
-        doc_id = str(uuid.uuid4())
-
-        collection.add(
-            ids=[doc_id],
-            embeddings=[embedding.tolist()],
-            metadatas=[metadata]
+        ids.append(chunk_id)
+        documents.append(code)
+        keep.append(i)
+        metadatas.append(metadata)
+    skipped = len(reused)
+
+    # Embed only the new or changed chunks. Chroma accepts the float32 ndarray
+    # as is, so the rows are never converted to Python lists.
+    embeddings = []
+    if documents:
+        new_vectors = embed(documents)
+        embeddings = np.asarray(new_vectors, dtype='float32')
+
+    # Keep a copy of this run's vectors, new and reused, for the FAISS search backend
+    if reused:
+        dim = len(next(iter(reused.values())))
+        vector_embeddings = np.empty((len(cleaned_chunks), dim), dtype='float32')
+        if keep:
+            vector_embeddings[keep] = new_vectors
+        for i, embedding in reused.items():
+            vector_embeddings[i] = embedding
+    else:
+        vector_embeddings = new_vectors
+    save_vectors(os.path.dirname(json_file_path), vector_embeddings, metadata_list)
+
+    if skipped:
+        print(f"Skipped {skipped} unchanged chunks already in the DB")
+
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        # Chunk IDs are the row IDs, so a repeated ID updates its row
+        collection.upsert(
+            ids=ids[start:end],
+            embeddings=embeddings[start:end],
+            documents=documents[start:end],
+            metadatas=metadatas[start:end]
         )
+        logger.debug("Stored batch of %d chunks", len(ids[start:end]))
+
+    new_chunks_added = len(ids)
 
-        print(f"Stored new chunk: {chunk_id}")
-        new_chunks_added += 1
+    # Chunk IDs are positional, so rows whose IDs this run did not produce
+    # (removed or shifted chunks, rows from before chunk IDs were the row IDs)
+    # would otherwise keep turning up in search results
+    current_ids = set(candidate_ids)
+    stale_ids = [row_id for row_id in collection.get(include=[])['ids'] if row_id not in current_ids]
+    for start in range(0, len(stale_ids), batch_size):
+        collection.delete(ids=stale_ids[start:start + batch_size])
+    if stale_ids:
+        print(f"Removed {len(stale_ids)} stale chunks from ChromaDB.")
 
-    updated_metadata = collection.get(include=['metadatas'])['metadatas'] or []
     print(f"Stored {new_chunks_added} new unique code chunks in ChromaDB.")
-    print(f"Total chunks in DB after insertion: {len(updated_metadata)}")
+    # count() is answered from the index; no rows are fetched
+    print(f"Total chunks in DB after insertion: {collection.count()}")
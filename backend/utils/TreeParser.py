@@ -1,8 +1,50 @@
 import os
+import sys
 import ast
 import re
+import hashlib
+import importlib.util
+import threading
+import tempfile
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import dataclasses
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
 from typing import List, Dict, Tuple
 from pathlib import Path
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# For vectorized newline scanning
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# For tree-sitter parsing (all supported languages, preferred when present)
+try:
+    from tree_sitter_languages import get_language, get_parser
+    TREE_SITTER_AVAILABLE = True
+except ImportError:
+    TREE_SITTER_AVAILABLE = False
+
+# For the regex fallback's definition scan (linear-time, no backtracking)
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
+# Otherwise long lines are scanned with the regex module, under a time limit
+try:
+    import regex
+    REGEX_AVAILABLE = True
+except ImportError:
+    REGEX_AVAILABLE = False
 
 # For C++ Parsing
 try:
@@ -10,16 +52,94 @@ try:
     CLANG_AVAILABLE = True
 except ImportError:
     CLANG_AVAILABLE = False
-    print("Warning: clang.cindex not available. C++ parsing will use fallback method.")
+    logger.warning("clang.cindex not available. C++ parsing will use fallback method.")
 
+# One libclang index per process, created on first use: creating it loads
+# libclang, which processes that never see C++ (and freshly started pool
+# workers) should not pay for at import.
+_CLANG_INDEX = None
+_clang_index_lock = threading.Lock()
 
-# For JavaScript parsing
-try:
-    import esprima
-    ESPRIMA_AVAILABLE = True
-except ImportError:
-    ESPRIMA_AVAILABLE = False
-    print("Warning: esprima not available. JavaScript parsing will be limited.")
+def _clang_index():
+    """The process's libclang index, or None (and C++ falls back) if libclang can't load."""
+    global _CLANG_INDEX, CLANG_AVAILABLE
+    if _CLANG_INDEX is None and CLANG_AVAILABLE:
+        with _clang_index_lock:
+            if _CLANG_INDEX is None and CLANG_AVAILABLE:
+                try:
+                    _CLANG_INDEX = clang.cindex.Index.create()
+                except Exception as e:
+                    CLANG_AVAILABLE = False
+                    logger.warning("libclang could not be loaded (%s). C++ parsing will use fallback method.", e)
+    return _CLANG_INDEX
+
+# Cursor kinds chunked by the clang path -> chunk type. Keyed by the raw
+# kind id (Cursor._kind_id), so rejected cursors never build a CursorKind.
+_CLANG_CHUNK_TYPES = {}
+if CLANG_AVAILABLE:
+    _CursorKind = clang.cindex.CursorKind
+    _CLANG_CHUNK_TYPES = {
+        _CursorKind.FUNCTION_DECL.value: 'function',
+        _CursorKind.CXX_METHOD.value: 'function',
+        _CursorKind.CONSTRUCTOR.value: 'function',
+        _CursorKind.DESTRUCTOR.value: 'function',
+        _CursorKind.CLASS_DECL.value: 'class',
+        _CursorKind.STRUCT_DECL.value: 'class',
+        _CursorKind.CLASS_TEMPLATE.value: 'class',
+        _CursorKind.NAMESPACE.value: 'namespace',
+    }
+
+# Recently parsed translation units by path. Parsing a path again reparses
+# its TU, which reuses the precompiled preamble (the headers) when the
+# includes are unchanged. A TU is taken out of the cache while in use.
+CLANG_TU_CACHE_SIZE = 8
+_clang_tus = OrderedDict()
+_clang_tus_lock = threading.Lock()
+
+def _clang_translation_unit(source_path: str, code: str):
+    unsaved_files = [(source_path, code)]
+    with _clang_tus_lock:
+        tu = _clang_tus.pop(source_path, None)
+    if tu is not None:
+        try:
+            tu.reparse(unsaved_files=unsaved_files)
+            return tu
+        except clang.cindex.TranslationUnitLoadError:
+            pass
+    return _clang_index().parse(
+        source_path,
+        args=['-x', 'c++'],
+        unsaved_files=unsaved_files,
+        options=(clang.cindex.TranslationUnit.PARSE_INCOMPLETE
+                 | clang.cindex.TranslationUnit.PARSE_PRECOMPILED_PREAMBLE)
+    )
+
+def _clang_keep_translation_unit(source_path: str, tu) -> None:
+    with _clang_tus_lock:
+        _clang_tus[source_path] = tu
+        while len(_clang_tus) > CLANG_TU_CACHE_SIZE:
+            _clang_tus.popitem(last=False)
+
+def _clang_file_name(cursor):
+    """Name of the file cursor is located in, or None (e.g. built-ins)."""
+    location_file = cursor.location.file
+    return location_file.name if location_file is not None else None
+
+
+# For JavaScript parsing. Only looked up here: importing esprima builds its
+# Unicode tables (about a second), which processes that parse JavaScript with
+# tree-sitter, such as every freshly spawned pool worker, should not pay.
+esprima = None
+ESPRIMA_AVAILABLE = importlib.util.find_spec('esprima') is not None
+if not ESPRIMA_AVAILABLE:
+    logger.warning("esprima not available. JavaScript parsing will be limited.")
+
+def _esprima():
+    """The esprima module, imported on first use."""
+    global esprima
+    if esprima is None:
+        import esprima
+    return esprima
 
 # For Java parsing
 try:
@@ -27,7 +147,7 @@ try:
     JAVALANG_AVAILABLE = True
 except ImportError:
     JAVALANG_AVAILABLE = False
-    print("Warning: javalang not available. Java parsing will be limited.")
+    logger.warning("javalang not available. Java parsing will be limited.")
 
 # For C/C++ parsing
 try:
@@ -36,118 +156,524 @@ try:
     PYCPARSER_AVAILABLE = True
 except ImportError:
     PYCPARSER_AVAILABLE = False
-    print("Warning: pycparser not available. C/C++ parsing will be limited.")
+    logger.warning("pycparser not available. C/C++ parsing will be limited.")
+
+# Comments in the C-style fallback tables (JavaScript, Java, C, C++ and the
+# generic table). An unterminated block comment runs to the end of the
+# text, so each '/*' is scanned past once rather than once per retry.
+_C_COMMENT_SOURCE = r'//[^\n]*|/\*[\s\S]*?(?:\*/|\Z)'
+
+def _strip_spans(code: str, spans: List[Tuple[int, int]]):
+    """Remove spans from code; returns the text and a function mapping its
+    offsets back to offsets in code."""
+    parts = []
+    kept_starts = []  # offset of each kept segment in the stripped text
+    kept_origins = []  # ... and in code
+    pos = stripped_len = 0
+    for start, end in spans:
+        parts.append(code[pos:start])
+        kept_starts.append(stripped_len)
+        kept_origins.append(pos)
+        stripped_len += start - pos
+        pos = end
+    parts.append(code[pos:])
+    kept_starts.append(stripped_len)
+    kept_origins.append(pos)
+
+    def to_original(offset: int) -> int:
+        # Offsets on a segment boundary map to the later segment
+        i = bisect_right(kept_starts, offset) - 1
+        return kept_origins[i] + offset - kept_starts[i]
+    return ''.join(parts), to_original
+
+# Compiled once per process for the regex fallbacks. All patterns use
+# re.MULTILINE, which the Python '#.*$' comment pattern relies on.
+def _compile_patterns(patterns: Dict[str, str]) -> Dict[str, 're.Pattern']:
+    return {name: re.compile(pattern, re.MULTILINE) for name, pattern in patterns.items()}
+
+_JS_FALLBACK_PATTERNS = _compile_patterns({
+    'function': r'(?:async\s+)?(?:function\s+([a-zA-Z_]\w*)|(?:const|let|var)\s+([a-zA-Z_]\w*)\s*=\s*(?:async\s+)?(?:function\s*)?\(.*?\)\s*=>\s*{?|\(.*?\)\s*=>\s*{?|\bfunction\s*\([^)]*\)\s*{)',
+    'class': r'class\s+([a-zA-Z_]\w*)\s*(?:extends\s+[a-zA-Z_]\w*)?\s*{',
+    'comment': _C_COMMENT_SOURCE
+})
+
+_PY_FALLBACK_PATTERNS = _compile_patterns({
+    'function': r'^\s*(?:async\s+)?def\s+([a-zA-Z_]\w*)\s*\([^)]*\)\s*:',
+    'class': r'^\s*class\s+([a-zA-Z_]\w*)\s*(?:\([^)]*\))?\s*:',
+    'comment': r'#.*$'
+})
+
+_JAVA_FALLBACK_PATTERNS = _compile_patterns({
+    'function': r'(?:public|private|protected)?\s+(?:static\s+)?[\w<>\[\],\s]+\s+([a-zA-Z_]\w*)\s*\([^)]*\)\s*(?:throws\s+[\w\s,]+)?\s*{',
+    'class': r'(?:public|private|protected)?\s+class\s+([a-zA-Z_]\w*)\s*(?:extends\s+[a-zA-Z_]\w*)?(?:\s+implements\s+[a-zA-Z_]\w*(?:\s*,\s*[a-zA-Z_]\w*)*)?\s*{',
+    'comment': _C_COMMENT_SOURCE
+})
+
+_C_FALLBACK_PATTERNS = _compile_patterns({
+    'function': r'\b[a-zA-Z_][a-zA-Z0-9_]*\s+\**([a-zA-Z_][a-zA-Z0-9_]*)\s*\([^)]*\)\s*{',
+    'struct': r'struct\s+([a-zA-Z_]\w*)\s*{',
+    'union': r'union\s+([a-zA-Z_]\w*)\s*{',
+    'comment': _C_COMMENT_SOURCE
+})
+
+_CPP_FALLBACK_PATTERNS = _compile_patterns({
+    'function': r'(?:virtual\s+|static\s+|inline\s+)?\b(?:[a-zA-Z_][a-zA-Z0-9_:<>]*(?:::[a-zA-Z_][a-zA-Z0-9_:<>]*)*)\s+\**(?:[a-zA-Z_][a-zA-Z0-9_]*(?:::[a-zA-Z_][a-zA-Z0-9_]*)*)?\s*\([^)]*\)\s*(?:const|noexcept|override|final|throw\([^)]*\))?\s*(?:->.*?)?\s*{',
+    'class': r'(?:class|struct)\s+([a-zA-Z_]\w*)\s*(?:final|sealed)?(?:\s*:\s*(?:public|private|protected)?\s+[a-zA-Z_][a-zA-Z0-9_:<>]*(?:\s*,\s*(?:public|private|protected)?\s+[a-zA-Z_][a-zA-Z0-9_:<>]*)*)?(?:\s*\{)',
+    'namespace': r'namespace\s+(?:[a-zA-Z_]\w*)\s*\{',
+    'template': r'template\s*<[^>]*>\s*(?:class|struct|typename)\s+([a-zA-Z_]\w*)\s*(?::[^{]*)?{',
+    'comment': _C_COMMENT_SOURCE
+})
+
+# Definition patterns of a fallback table merged into one alternation of
+# named groups, so the regex path scans the code once; match.lastgroup is
+# the definition type. Keyed by the pattern sources (and engine).
+_definition_patterns = {}
+
+# Lines at least this long are scanned with RE2 when it is installed, else
+# with the regex module for at most REGEX_TIMEOUT seconds per file. Patterns
+# like the JS '\(.*?\)\s*=>' backtrack quadratically along a line, which is
+# seconds on minified code; on ordinary code Python's re is the faster one.
+RE2_MIN_LINE = 1000
+REGEX_TIMEOUT = 1.0
+
+def _definition_pattern(patterns: Dict[str, 're.Pattern'], long_lines: bool = False):
+    """The merged definition pattern, built for long lines if long_lines.
+
+    RE2 gives the same leftmost-first matches, except that its \w, \s and \b
+    are ASCII-only; the regex module gives the same matches as re.
+    """
+    sources = tuple((name, pattern.pattern) for name, pattern in patterns.items() if name != 'comment')
+    if not sources:
+        return None
+    engine = 're'
+    if long_lines:
+        engine = 're2' if RE2_AVAILABLE else 'regex' if REGEX_AVAILABLE else 're'
+    merged = _definition_patterns.get((sources, engine))
+    if merged is None:
+        alternation = '|'.join(f'(?P<{name}>{source})' for name, source in sources)
+        merged = None
+        if engine == 're2':
+            try:
+                merged = re2.compile('(?m)' + alternation)
+            except re2.error:
+                pass
+        elif engine == 'regex':
+            merged = regex.compile(alternation, regex.MULTILINE)
+        if merged is None:
+            merged = re.compile(alternation, re.MULTILINE)
+        _definition_patterns[(sources, engine)] = merged
+    return merged
+
+def _finditer_bounded(pattern, text: str, file_path: str):
+    """pattern.finditer(text), except that a regex-module scan stops after
+    REGEX_TIMEOUT seconds, keeping the matches found until then."""
+    if not (REGEX_AVAILABLE and isinstance(pattern, regex.Pattern)):
+        yield from pattern.finditer(text)
+        return
+    try:
+        yield from pattern.finditer(text, timeout=REGEX_TIMEOUT)
+    except TimeoutError:
+        logger.warning("Definition scan of %s timed out; the rest is chunked as global code", file_path)
+
+def _has_long_line(code: str, limit: int) -> bool:
+    start = 0
+    end = code.find('\n')
+    while end != -1:
+        if end - start >= limit:
+            return True
+        start = end + 1
+        end = code.find('\n', start)
+    return len(code) - start >= limit
+
+# Preprocessor lines, line comments and block comments, removed in one pass
+# before handing C to pycparser. Lines become '\n'; block comments vanish.
+_C_PREPROC_AND_COMMENTS = re.compile(r'/\*[\s\S]*?\*/|#[^\n]*\n?|//[^\n]*\n?')
+
+def _strip_c_preproc_or_comment(match: 're.Match') -> str:
+    return '' if match.group().startswith('/*') else '\n'
+
+# Locating pycparser definitions in the original source: a function is its
+# name followed by a parameter list and '{', a struct/union its tag and '{'.
+_C_FUNCTION_HEADER = re.compile(r'\b([a-zA-Z_]\w*)\s*\([^)]*\)\s*{')
+_C_STRUCT_HEADER = re.compile(r'(?:struct|class|union)\s+([a-zA-Z_]\w*)\s*{')
+
+_BLANK_LINES = re.compile(r'\n\s*\n')
+
+# Used for recognized languages without a dedicated processor.
+_GENERIC_PATTERNS = _compile_patterns({
+    'function': r'\b\w+\s+\w+\s*\([^)]*\)\s*{',
+    'class': r'(?:class|struct)\s+\w+\s*{',
+    'comment': _C_COMMENT_SOURCE
+})
+
+# Substrings every chunkable definition contains, per language. Files with
+# none of them become a single global chunk without being parsed. C++ keeps
+# ';' because clang also reports prototypes and forward declarations.
+_DEFINITION_KEYWORDS = {
+    'python': ('def', 'class'),
+    'javascript': ('function', 'class', '=>'),
+    'java': ('class', 'interface', 'enum', 'record'),
+    'c': ('{',),
+    'cpp': ('{', ';'),
+}
+
+# Definitions captured by the tree-sitter path, per language: node type ->
+# chunk type. Node types missing from an installed grammar are skipped.
+_TS_DEFINITIONS = {
+    'python': {'function_definition': 'function', 'class_definition': 'class',
+               'decorated_definition': None},
+    'javascript': {'function_declaration': 'function', 'generator_function_declaration': 'function',
+                   'class_declaration': 'class'},
+    'java': {'class_declaration': 'class', 'method_declaration': 'function'},
+    'c': {'function_definition': 'function', 'struct_specifier': 'class', 'union_specifier': 'class'},
+    'cpp': {'function_definition': 'function', 'class_specifier': 'class', 'struct_specifier': 'class',
+            'union_specifier': 'class', 'namespace_definition': 'namespace'},
+}
+# Struct/union/class specifiers only count when they have a body.
+_TS_NEEDS_BODY = {'struct_specifier', 'class_specifier', 'union_specifier'}
+# `const f = function () {}` / `const f = () => {}` are chunked as functions.
+_TS_JS_FUNCTION_VALUES = ('function', 'function_expression', 'arrow_function')
+
+_ts_queries = {}
+
+def _ts_inside_python_function(node) -> bool:
+    """Whether a Python definition is nested in a function body.
+
+    Such definitions stay part of the enclosing function's chunk, as in
+    _python_definitions; only module and class bodies are chunked.
+    """
+    parent = node.parent
+    while parent is not None:
+        if parent.type == 'function_definition':
+            return True
+        parent = parent.parent
+    return False
+
+def _ts_has_node_type(ts_language, node_type: str) -> bool:
+    # Compiling a one-node query is the portable way to probe a grammar;
+    # unknown node types raise NameError.
+    try:
+        ts_language.query(f'({node_type}) @node')
+    except NameError:
+        return False
+    return True
+
+def _ts_query(language: str):
+    """Compile (once) the definitions query for a tree-sitter language."""
+    query = _ts_queries.get(language)
+    if query is None:
+        ts_language = get_language(language)
+        patterns = []
+        for node_type in _TS_DEFINITIONS[language]:
+            if not _ts_has_node_type(ts_language, node_type):
+                continue
+            if node_type in _TS_NEEDS_BODY:
+                patterns.append(f'({node_type} body: (_)) @{node_type}')
+            else:
+                patterns.append(f'({node_type}) @{node_type}')
+        if language == 'javascript':
+            values = ' '.join(f'({value})' for value in _TS_JS_FUNCTION_VALUES
+                              if _ts_has_node_type(ts_language, value))
+            patterns.append(f'(variable_declarator value: [{values}]) @variable_declarator')
+        query = ts_language.query('\n'.join(patterns))
+        _ts_queries[language] = query
+    return query
+
+# Last tree-sitter tree per (language, path). Chunking a path again edits the
+# old tree to the changed byte range and reparses incrementally, which only
+# redoes the work around the edit. A tree is taken out of the cache while in use.
+TS_TREE_CACHE_SIZE = 32
+_ts_trees = OrderedDict()
+_ts_trees_lock = threading.Lock()
+
+def _common_prefix_len(a: bytes, b: bytes, limit: int) -> int:
+    """Length of the common prefix of a and b, at most limit; bisects with memcmp-backed compares."""
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _common_suffix_len(a: bytes, b: bytes, limit: int) -> int:
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:len(a) - lo] == b[len(b) - mid:len(b) - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _ts_point(source: bytes, offset: int) -> Tuple[int, int]:
+    """tree-sitter (row, byte column) of a byte offset."""
+    return source.count(b'\n', 0, offset), offset - (source.rfind(b'\n', 0, offset) + 1)
+
+def _ts_parse(parser, language: str, file_path: str, source: bytes):
+    """Parse source, incrementally from the last tree for file_path when there is one."""
+    with _ts_trees_lock:
+        cached = _ts_trees.pop((language, file_path), None) if file_path else None
+    if cached is None:
+        return parser.parse(source)
+    old_source, tree = cached
+    if old_source == source:
+        return tree
+    # One edit spanning everything between the common prefix and suffix
+    start = _common_prefix_len(old_source, source, min(len(old_source), len(source)))
+    suffix = _common_suffix_len(old_source, source, min(len(old_source), len(source)) - start)
+    old_end, new_end = len(old_source) - suffix, len(source) - suffix
+    tree.edit(start_byte=start, old_end_byte=old_end, new_end_byte=new_end,
+              start_point=_ts_point(source, start), old_end_point=_ts_point(old_source, old_end),
+              new_end_point=_ts_point(source, new_end))
+    return parser.parse(source, tree)
+
+def _ts_keep_tree(language: str, file_path: str, source: bytes, tree) -> None:
+    if not file_path:
+        return
+    with _ts_trees_lock:
+        _ts_trees[(language, file_path)] = (source, tree)
+        while len(_ts_trees) > TS_TREE_CACHE_SIZE:
+            _ts_trees.popitem(last=False)
+
+def _lazy(compute, *args):
+    """Defer compute(*args) until the returned callable is first called."""
+    result = []
+    def get():
+        if not result:
+            result.append(compute(*args))
+        return result[0]
+    return get
+
+# Parsed trees shared by CodeChunker instances created with cache_parses=True,
+# keyed by (parser, blake2b(code)). Trees are only read after parsing.
+PARSE_CACHE_SIZE = 1000
+_parse_cache = OrderedDict()
+_parse_cache_lock = threading.Lock()
+
+def _cached_parse(kind: str, code: str, parse):
+    key = (kind, hashlib.blake2b(code.encode('utf-8', 'surrogatepass'), digest_size=16).digest())
+    with _parse_cache_lock:
+        tree = _parse_cache.get(key)
+        if tree is not None:
+            _parse_cache.move_to_end(key)
+            return tree
+    tree = parse(code)
+    with _parse_cache_lock:
+        _parse_cache[key] = tree
+        while len(_parse_cache) > PARSE_CACHE_SIZE:
+            _parse_cache.popitem(last=False)
+    return tree
+
+# On-disk chunk cache (CodeChunker(cache_dir=...)): one JSON file per
+# sha256 of the source, language and available parsers. Bump the version
+# whenever a change to the chunker alters its output.
+CHUNK_CACHE_VERSION = 4
+
+def _chunk_cache_key(language: str, code: str, top_level_only: bool = False) -> str:
+    backends = (TREE_SITTER_AVAILABLE, ESPRIMA_AVAILABLE, JAVALANG_AVAILABLE,
+                PYCPARSER_AVAILABLE, CLANG_AVAILABLE)
+    digest = hashlib.sha256(f"{CHUNK_CACHE_VERSION}:{language}:{backends}:{top_level_only}:".encode())
+    digest.update(code.encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+@dataclasses.dataclass(slots=True)
+class CodeChunk:
+    """One function, class or stretch of global code cut from a source file."""
+    chunk_id: str
+    file_path: str
+    code: str
+    start_line: int
+    end_line: int
+    byte_range: Tuple[int, int]
+    language: str
+
+# File extension (without the dot, lowercased) -> language, for detect_language
+_EXT_TO_LANG = {
+    'py': 'python',
+    'js': 'javascript',
+    'jsx': 'javascript',
+    'java': 'java',
+    'c': 'c',
+    'cpp': 'cpp',
+    'h': 'cpp'
+}
+
+def _outermost_chunks(chunks: List[CodeChunk]) -> List[CodeChunk]:
+    """chunks without those lying inside another one's byte range, in their order."""
+    nested = set()
+    covered_end = -1
+    for chunk in sorted(chunks, key=lambda chunk: (chunk.byte_range[0], -chunk.byte_range[1])):
+        if chunk.byte_range[1] <= covered_end:
+            nested.add(id(chunk))
+        else:
+            covered_end = chunk.byte_range[1]
+    return [chunk for chunk in chunks if id(chunk) not in nested] if nested else chunks
 
 class CodeChunker:
-    def __init__(self):
+    def __init__(self, cache_parses: bool = False, cache_dir: str = None, top_level_only: bool = False):
         self.code_chunks = []
         self.chunk_counter = 0
+        # Keep only chunks not nested in another: a class, but not its methods.
+        # Fewer, non-overlapping chunks to embed, at the cost of method-level hits.
+        self.top_level_only = top_level_only
+        # Reuse parse trees for identical source; worth it when the same files
+        # are chunked repeatedly, pure overhead for one-shot indexing.
+        self.cache_parses = cache_parses
+        # Directory for the on-disk chunk cache, so re-indexing skips parsing
+        # files whose content has not changed. None disables it.
+        self.cache_dir = cache_dir
+        self._ts_parsers = {}
+        # (code, newline offsets) for the file being chunked, so every parser
+        # path and fallback for it shares one newline scan
+        self._newlines = None
+        # Language -> chunking method, so process_code dispatches with one lookup
+        self._language_handlers = {
+            'python': self.process_python,
+            'javascript': self.process_javascript,
+            'jsx': self.process_javascript,
+            'java': self.process_java,
+            'c': lambda file_path, code: self.process_c_cpp(file_path, code, 'c'),
+            'cpp': lambda file_path, code: self.process_c_cpp(file_path, code, 'cpp'),
+        }
+
+    def _parse(self, kind: str, code: str, parse):
+        if self.cache_parses:
+            return _cached_parse(kind, code, parse)
+        return parse(code)
 
     def detect_language(self, file_path: str) -> str:
         """Detect programming language based on file extension."""
-        ext = os.path.splitext(file_path)[1].lower()
-        ext_to_lang = {
-            '.py': 'python',
-            '.js': 'javascript',
-            '.jsx': 'javascript',
-            '.java': 'java',
-            '.c': 'c',
-            '.cpp': 'cpp',
-            '.h': 'cpp'
-        }
-        return ext_to_lang.get(ext, 'unknown')
+        return _EXT_TO_LANG.get(file_path.rpartition('.')[2].lower(), 'unknown')
 
     def store_chunk(self, file_path, chunk_id, code, start_line, end_line, byte_range, language):
-        self.code_chunks.append({
-            'chunk_id': chunk_id,
-            'file_path': file_path,
-            'code': code,
-            'start_line': start_line,
-            'end_line': end_line,
-            'byte_range': byte_range,
-            'language': language
-        })
+        # Interned so every chunk shares one string per language, including
+        # chunks that come back unpickled from worker processes.
+        self.code_chunks.append(CodeChunk(chunk_id, file_path, code, start_line, end_line, byte_range, sys.intern(language)))
         self.chunk_counter += 1
 
+    @staticmethod
+    def _first_match_starts(pattern: 're.Pattern', code: str) -> Dict[str, int]:
+        """Map each name captured by pattern to the start of its first match."""
+        starts = {}
+        for match in pattern.finditer(code):
+            starts.setdefault(match.group(1), match.start())
+        return starts
+
     def normalize_code(self, code: str) -> str:
         code = code.strip()
-        code = re.sub(r'\n\s*\n', '\n\n', code)
+        code = _BLANK_LINES.sub('\n\n', code)
         code = code.replace('\r\n', '\n')
         return code
 
     def _calculate_line_offsets(self, code: str) -> List[int]:
         line_offsets = [0]
-        current = 0
-        for line in code.split('\n'):
-            current += len(line) + 1
-            line_offsets.append(current)
+        line_offsets.extend(pos + 1 for pos in self._newline_offsets(code))
+        line_offsets.append(len(code) + 1)
         if not code.endswith('\n'):
             line_offsets[-1] -= 1
         return line_offsets
 
-    def process_python(self, file_path: str, code: str) -> None:
-        try:
-            tree = ast.parse(code)
-        except SyntaxError as e:
-            print(f"SyntaxError in {file_path}: {e}")
-            return
+    def _code_units(self, code: str):
+        # Code units for vectorized scans; ASCII text (the common case) is
+        # scanned as bytes, anything else as UTF-32 so positions stay
+        # character offsets.
+        if code.isascii():
+            return np.frombuffer(code.encode('ascii'), dtype=np.uint8)
+        return np.frombuffer(code.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
 
-        lines = code.split('\n')
-        line_offsets = self._calculate_line_offsets(code)
+    def _newline_offsets(self, code: str) -> List[int]:
+        """Sorted positions of every '\\n' in code, for _line_at(). Callers must not modify it."""
+        cached = self._newlines
+        if cached is not None and cached[0] is code:
+            return cached[1]
+        newlines = self._scan_newlines(code)
+        self._newlines = (code, newlines)
+        return newlines
 
-        nodes = []
-        for node in ast.walk(tree):
-            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
-                start_line = node.lineno
-                end_line = getattr(node, 'end_lineno', start_line)
-                nodes.append((start_line, end_line, node))
+    def _scan_newlines(self, code: str) -> List[int]:
+        if NUMPY_AVAILABLE:
+            return np.flatnonzero(self._code_units(code) == 10).tolist()
+        newlines = []
+        pos = code.find('\n')
+        while pos != -1:
+            newlines.append(pos)
+            pos = code.find('\n', pos + 1)
+        return newlines
 
-        nodes.sort(key=lambda x: x[0])
-        all_chunks = []
-        previous_end_line = 0
+    def _brace_matcher(self, code: str):
+        """Return a function mapping a position in code to the first '}' after it
+        that balances every brace seen from there on, or -1.
 
-        for i, (start_line, end_line, node) in enumerate(nodes):
-            if previous_end_line < start_line - 1:
-                global_start = previous_end_line + 1
-                global_end = start_line - 1
-                global_code = '\n'.join(lines[global_start-1:global_end])
-                if global_code.strip():
-                    start_byte = line_offsets[global_start-1]
-                    end_byte = line_offsets[global_end] - 1 if global_end < len(line_offsets) else line_offsets[-1]
-                    all_chunks.append(('global', global_start, global_end, start_byte, end_byte, global_code))
+        Braces are indexed once per code: the scan from start stops at the
+        first '}' whose running depth is back to the depth before start, so
+        each lookup is a binary search among the '}'s at that depth.
+        """
+        if NUMPY_AVAILABLE:
+            units = self._code_units(code)
+            braces = np.flatnonzero((units == 0x7b) | (units == 0x7d))
+            count = len(braces)
+            depth = np.cumsum(np.where(units[braces] == 0x7b, 1, -1))
+            closes = np.flatnonzero(units[braces] == 0x7d)
+            low = int(depth.min()) if count else 0
+            # One sorted key per '}': (depth after it, then brace index)
+            keys = np.sort((depth[closes] - low) * count + closes)
 
-            node_code = '\n'.join(lines[start_line-1:end_line])
-            start_byte = line_offsets[start_line-1]
-            end_byte = line_offsets[end_line] - 1 if end_line < len(line_offsets) else line_offsets[-1]
-            all_chunks.append(('node', start_line, end_line, start_byte, end_byte, node_code, node))
-            previous_end_line = end_line
+            def match(start: int) -> int:
+                i = int(np.searchsorted(braces, start))
+                level = (int(depth[i - 1]) if i else 0) - low
+                if i == count or level < 0:
+                    return -1
+                k = int(np.searchsorted(keys, level * count + i))
+                if k == len(keys) or keys[k] // count != level:
+                    return -1
+                return int(braces[keys[k] % count])
+            return match
 
-        if previous_end_line < len(lines):
-            global_start = previous_end_line + 1
-            global_end = len(lines)
-            global_code = '\n'.join(lines[global_start-1:global_end])
-            if global_code.strip():
-                start_byte = line_offsets[global_start-1]
-                end_byte = line_offsets[global_end-1] if global_end-1 < len(line_offsets) else line_offsets[-1]
-                all_chunks.append(('global', global_start, global_end, start_byte, end_byte, global_code))
+        braces = []
+        depth_before = []
+        closes_at = {}  # depth after a '}' -> its brace indices, ascending
+        depth = 0
+        for pos, char in enumerate(code):
+            if char == '{' or char == '}':
+                depth_before.append(depth)
+                depth += 1 if char == '{' else -1
+                if char == '}':
+                    closes_at.setdefault(depth, []).append(len(braces))
+                braces.append(pos)
 
-        if not nodes and code.strip():
-            start_byte = 0
-            end_byte = len(code)
-            self.store_chunk(file_path, "python_global_1", code, 1, len(lines), (start_byte, end_byte), "python")
+        def match(start: int) -> int:
+            i = bisect_left(braces, start)
+            if i == len(braces):
+                return -1
+            candidates = closes_at.get(depth_before[i], ())
+            k = bisect_left(candidates, i)
+            return braces[candidates[k]] if k < len(candidates) else -1
+        return match
 
-        for chunk in all_chunks:
-            if chunk[0] == 'global':
-                _, sl, el, sb, eb, code_chunk = chunk
-                self.chunk_counter += 1
-                self.store_chunk(file_path, f"python_global_{self.chunk_counter}", code_chunk, sl, el, (sb, eb), "python")
-            else:
-                _, sl, el, sb, eb, code_chunk, node = chunk
-                self.chunk_counter += 1
-                type_name = 'function' if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) else 'class'
-                self.store_chunk(file_path, f"python_{type_name}_{self.chunk_counter}", code_chunk, sl, el, (sb, eb), "python")
+    @staticmethod
+    def _slice_lines(code: str, line_offsets: List[int], start: int, end: int) -> str:
+        """Lines start..end (1-based, inclusive) of code, without the final newline.
+
+        Same result as '\\n'.join(code.split('\\n')[start-1:end]), sliced straight
+        out of code using offsets from _calculate_line_offsets().
+        """
+        line_count = len(line_offsets) - 1
+        if start > line_count or end < start:
+            return ''
+        stop = line_offsets[end] - 1 if end < line_count else len(code)
+        return code[line_offsets[start-1]:stop]
+
+    @staticmethod
+    def _line_at(newlines: List[int], pos: int) -> int:
+        """1-based line of character pos; same as code.count('\\n', 0, pos) + 1."""
+        return bisect_left(newlines, pos) + 1
 
     def process_javascript(self, file_path: str, code: str) -> None:
+        if TREE_SITTER_AVAILABLE and self._process_with_tree_sitter(file_path, code, 'javascript'):
+            return
+
         if not ESPRIMA_AVAILABLE:
             # Fallback to regex-based parsing if esprima is not available
             self._process_javascript_fallback(file_path, code)
@@ -155,51 +681,51 @@ class CodeChunker:
             
         try:
             # Parse JavaScript code using esprima
-            ast = esprima.parseScript(code, {'loc': True, 'range': True})
+            ast = self._parse('javascript', code,
+                              lambda src: _esprima().parseScript(src, {'loc': True, 'range': True}))
             
-            # Extract functions and classes
-            functions = []
-            classes = []
+            # Extract functions and classes as (start offset, node)
+            collected = []
             
-            def visit_node(node, parent=None):
-                if node.type == 'FunctionDeclaration':
-                    functions.append(node)
-                elif node.type == 'ClassDeclaration':
-                    classes.append(node)
-                elif node.type == 'VariableDeclaration':
+            # Walk the tree with an explicit stack; every property holding a
+            # node (or a list of nodes) is visited, as deep as the code nests.
+            stack = [ast]
+            while stack:
+                node = stack.pop()
+                node_type = node.type
+                if node_type == 'FunctionDeclaration' or node_type == 'ClassDeclaration':
+                    collected.append((node.range[0], node))
+                elif node_type == 'VariableDeclaration':
                     for declarator in node.declarations:
                         if (declarator.init and 
                             (declarator.init.type == 'FunctionExpression' or 
                              declarator.init.type == 'ArrowFunctionExpression')):
-                            functions.append(declarator)
+                            collected.append((declarator.range[0], declarator))
                 
-                # Recursively visit all properties of the node
                 for key, value in node.__dict__.items():
                     if key == 'parent':
                         continue
                     if isinstance(value, list):
-                        for item in value:
-                            if hasattr(item, 'type'):
-                                visit_node(item, node)
+                        stack.extend(item for item in value if hasattr(item, 'type'))
                     elif hasattr(value, 'type'):
-                        visit_node(value, node)
-            
-            visit_node(ast)
+                        stack.append(value)
             
             # Sort by start position
-            all_nodes = sorted(functions + classes, key=lambda x: x.range[0])
+            collected.sort(key=itemgetter(0))
             
             # Process chunks
+            # Only needed for non-blank global chunks
+            newlines = _lazy(self._newline_offsets, code)
             previous_end = 0
-            for node in all_nodes:
+            for _, node in collected:
                 start, end = node.range
                 
                 # Add global code before this node if any
                 if start > previous_end:
                     global_code = code[previous_end:start]
                     if global_code.strip():
-                        start_line = code.count('\n', 0, previous_end) + 1
-                        end_line = code.count('\n', 0, start) + 1
+                        start_line = self._line_at(newlines(), previous_end)
+                        end_line = self._line_at(newlines(), start)
                         self.chunk_counter += 1
                         self.store_chunk(
                             file_path, 
@@ -233,8 +759,8 @@ class CodeChunker:
             if previous_end < len(code):
                 global_code = code[previous_end:]
                 if global_code.strip():
-                    start_line = code.count('\n', 0, previous_end) + 1
-                    end_line = code.count('\n', 0, len(code)) + 1
+                    start_line = self._line_at(newlines(), previous_end)
+                    end_line = self._line_at(newlines(), len(code))
                     self.chunk_counter += 1
                     self.store_chunk(
                         file_path, 
@@ -247,45 +773,50 @@ class CodeChunker:
                     )
                     
         except Exception as e:
-            print(f"Error parsing JavaScript in {file_path}: {e}")
+            logger.warning("Error parsing JavaScript in %s: %s", file_path, e)
             # Fallback to regex-based parsing
             self._process_javascript_fallback(file_path, code)
 
     def _process_javascript_fallback(self, file_path: str, code: str) -> None:
-        # Fallback regex patterns for JavaScript
-        patterns = {
-            'function': r'(?:async\s+)?(?:function\s+([a-zA-Z_]\w*)|(?:const|let|var)\s+([a-zA-Z_]\w*)\s*=\s*(?:async\s+)?(?:function\s*)?\(.*?\)\s*=>\s*{?|\(.*?\)\s*=>\s*{?|\bfunction\s*\([^)]*\)\s*{',
-            'class': r'class\s+([a-zA-Z_]\w*)\s*(?:extends\s+[a-zA-Z_]\w*)?\s*{',
-            'comment': r'//.*$|/\*[\s\S]*?\*/'
-        }
-        
-        # Process with regex
-        self._process_with_regex(file_path, code, "javascript", patterns)
+        self._process_with_regex(file_path, code, "javascript", _JS_FALLBACK_PATTERNS)
+
+    def _python_definitions(self, tree):
+        """Yield module-level functions/classes and, recursively, class members.
+
+        Functions nested inside functions stay part of their parent's chunk, so
+        only the module and class bodies are visited rather than every node.
+        With top_level_only, class bodies are not visited either. The
+        tree-sitter path drops the same nested definitions from its query
+        captures (see _ts_inside_python_function).
+        """
+        for node in tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                yield node
+                if isinstance(node, ast.ClassDef) and not self.top_level_only:
+                    yield from self._python_definitions(node)
+
     def process_python(self, file_path: str, code: str) -> None:
+        if TREE_SITTER_AVAILABLE and self._process_with_tree_sitter(file_path, code, 'python'):
+            return
+
         try:
-            tree = ast.parse(code)
+            tree = self._parse('python', code, lambda src: ast.parse(src, type_comments=False))
         except SyntaxError as e:
-            print(f"SyntaxError in {file_path}: {e}")
+            logger.warning("SyntaxError in %s: %s", file_path, e)
             # Fallback to regex-based parsing
             self._process_python_fallback(file_path, code)
             return
 
-        lines = code.split('\n')
         line_offsets = self._calculate_line_offsets(code)
+        line_count = len(line_offsets) - 1
 
         nodes = []
-        for node in ast.walk(tree):
-            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
-                # Calculate start_line considering decorators
-                start_line = node.lineno
-                if hasattr(node, 'decorator_list') and node.decorator_list:
-                    decorator_lines = [dec.lineno for dec in node.decorator_list if hasattr(dec, 'lineno')]
-                    if decorator_lines:
-                        start_line = min(decorator_lines + [start_line])
-                end_line = getattr(node, 'end_lineno', start_line)
-                nodes.append((start_line, end_line, node))
-
-        nodes.sort(key=lambda x: x[0])
+        for node in self._python_definitions(tree):
+            # Decorators come first in source order, so the first one starts the chunk
+            start_line = node.decorator_list[0].lineno if node.decorator_list else node.lineno
+            nodes.append((start_line, node.end_lineno, node))
+
+        nodes.sort(key=itemgetter(0))
         all_chunks = []
         previous_end_line = 0
 
@@ -293,22 +824,22 @@ class CodeChunker:
             if previous_end_line < start_line - 1:
                 global_start = previous_end_line + 1
                 global_end = start_line - 1
-                global_code = '\n'.join(lines[global_start-1:global_end])
+                global_code = self._slice_lines(code, line_offsets, global_start, global_end)
                 if global_code.strip():
                     start_byte = line_offsets[global_start-1]
                     end_byte = line_offsets[global_end] - 1 if global_end < len(line_offsets) else line_offsets[-1]
                     all_chunks.append(('global', global_start, global_end, start_byte, end_byte, global_code))
 
-            node_code = '\n'.join(lines[start_line-1:end_line])
+            node_code = self._slice_lines(code, line_offsets, start_line, end_line)
             start_byte = line_offsets[start_line-1]
             end_byte = line_offsets[end_line] - 1 if end_line < len(line_offsets) else line_offsets[-1]
             all_chunks.append(('node', start_line, end_line, start_byte, end_byte, node_code, node))
             previous_end_line = end_line
 
-        if previous_end_line < len(lines):
+        if previous_end_line < line_count:
             global_start = previous_end_line + 1
-            global_end = len(lines)
-            global_code = '\n'.join(lines[global_start-1:global_end])
+            global_end = line_count
+            global_code = self._slice_lines(code, line_offsets, global_start, global_end)
             if global_code.strip():
                 start_byte = line_offsets[global_start-1]
                 end_byte = line_offsets[global_end-1] if global_end-1 < len(line_offsets) else line_offsets[-1]
@@ -317,7 +848,7 @@ class CodeChunker:
         if not nodes and code.strip():
             start_byte = 0
             end_byte = len(code)
-            self.store_chunk(file_path, "python_global_1", code, 1, len(lines), (start_byte, end_byte), "python")
+            self.store_chunk(file_path, "python_global_1", code, 1, line_count, (start_byte, end_byte), "python")
 
         for chunk in all_chunks:
             if chunk[0] == 'global':
@@ -331,14 +862,24 @@ class CodeChunker:
                 self.store_chunk(file_path, f"python_{type_name}_{self.chunk_counter}", code_chunk, sl, el, (sb, eb), "python")
 
     def _process_python_fallback(self, file_path: str, code: str) -> None:
-        patterns = {
-            'function': r'^\s*(?:async\s+)?def\s+([a-zA-Z_]\w*)\s*\([^)]*\)\s*:',
-            'class': r'^\s*class\s+([a-zA-Z_]\w*)\s*(?:\([^)]*\))?\s*:',
-            'comment': r'#.*$'
-        }
-        self._process_with_regex(file_path, code, 'python', patterns)
+        self._process_with_regex(file_path, code, 'python', _PY_FALLBACK_PATTERNS)
+
+    def _java_body_end(self, code: str, match_brace, line_offsets: List[int], line: int) -> int:
+        """Position of the '}' closing the body of the declaration starting on line, or -1.
+
+        The body is the first '{' at or after the start of that line; a ';'
+        before it means there is no body (abstract or interface method).
+        """
+        line_start = line_offsets[line - 1]
+        open_pos = code.find('{', line_start)
+        if open_pos == -1 or code.find(';', line_start, open_pos) != -1:
+            return -1
+        return match_brace(open_pos)
 
     def process_java(self, file_path: str, code: str) -> None:
+        if TREE_SITTER_AVAILABLE and self._process_with_tree_sitter(file_path, code, 'java'):
+            return
+
         if not JAVALANG_AVAILABLE:
             # Fallback to regex-based parsing if javalang is not available
             self._process_java_fallback(file_path, code)
@@ -346,7 +887,7 @@ class CodeChunker:
             
         try:
             # Parse Java code using javalang
-            tree = javalang.parse.parse(code)
+            tree = self._parse('java', code, javalang.parse.parse)
             
             # Extract classes and methods
             classes = []
@@ -360,54 +901,32 @@ class CodeChunker:
                 
             # Sort by position
             all_nodes = []
-            
-            for node in classes:
-                if hasattr(node, 'position') and node.position:
-                    start_pos = node.position.line
-                    # Approximate end position by counting braces
-                    class_text = code[code.find("class " + node.name):]
-                    open_braces = 0
-                    close_braces = 0
-                    for i, char in enumerate(class_text):
-                        if char == '{':
-                            open_braces += 1
-                        elif char == '}':
-                            close_braces += 1
-                            if open_braces == close_braces:
-                                end_pos = code.count('\n', 0, code.find("class " + node.name) + i) + 1
-                                all_nodes.append(('class', node, start_pos, end_pos))
-                                break
-            
-            for node in methods:
-                if hasattr(node, 'position') and node.position:
-                    start_pos = node.position.line
-                    # Approximate end position by counting braces
-                    method_text = code[code.find(node.name + "("):]
-                    open_braces = 0
-                    close_braces = 0
-                    for i, char in enumerate(method_text):
-                        if char == '{':
-                            open_braces += 1
-                        elif char == '}':
-                            close_braces += 1
-                            if open_braces == close_braces:
-                                end_pos = code.count('\n', 0, code.find(node.name + "(") + i) + 1
-                                all_nodes.append(('method', node, start_pos, end_pos))
-                                break
+            newlines = self._newline_offsets(code)
+            line_offsets = self._calculate_line_offsets(code)
+            match_brace = self._brace_matcher(code)
+
+            for node_type, nodes in (('class', classes), ('method', methods)):
+                for node in nodes:
+                    if hasattr(node, 'position') and node.position:
+                        start_pos = node.position.line
+                        # Approximate end position by counting braces
+                        close_pos = self._java_body_end(code, match_brace, line_offsets, start_pos)
+                        if close_pos != -1:
+                            end_pos = self._line_at(newlines, close_pos)
+                            all_nodes.append((node_type, node, start_pos, end_pos))
             
             # Sort by start position
-            all_nodes.sort(key=lambda x: x[2])
+            all_nodes.sort(key=itemgetter(2))
             
             # Process chunks
-            lines = code.split('\n')
-            line_offsets = self._calculate_line_offsets(code)
+            line_count = len(line_offsets) - 1
             previous_end_line = 0
             
             for node_type, node, start_line, end_line in all_nodes:
                 if previous_end_line < start_line - 1:
                     global_start = previous_end_line + 1
                     global_end = start_line - 1
-                    global_code = '\n'.join(lines[global_start-1:global_end])
+                    global_code = self._slice_lines(code, line_offsets, global_start, global_end)
                     if global_code.strip():
                         start_byte = line_offsets[global_start-1]
                         end_byte = line_offsets[global_end] - 1 if global_end < len(line_offsets) else line_offsets[-1]
@@ -422,7 +941,7 @@ class CodeChunker:
                             "java"
                         )
                 
-                node_code = '\n'.join(lines[start_line-1:end_line])
+                node_code = self._slice_lines(code, line_offsets, start_line, end_line)
                 start_byte = line_offsets[start_line-1]
                 end_byte = line_offsets[end_line] - 1 if end_line < len(line_offsets) else line_offsets[-1]
                 self.chunk_counter += 1
@@ -440,10 +959,10 @@ class CodeChunker:
                 previous_end_line = end_line
             
             # Add any remaining code as a global chunk
-            if previous_end_line < len(lines):
+            if previous_end_line < line_count:
                 global_start = previous_end_line + 1
-                global_end = len(lines)
-                global_code = '\n'.join(lines[global_start-1:global_end])
+                global_end = line_count
+                global_code = self._slice_lines(code, line_offsets, global_start, global_end)
                 if global_code.strip():
                     start_byte = line_offsets[global_start-1]
                     end_byte = line_offsets[global_end-1] if global_end-1 < len(line_offsets) else line_offsets[-1]
@@ -459,23 +978,18 @@ class CodeChunker:
                     )
                     
         except Exception as e:
-            print(f"Error parsing Java in {file_path}: {e}")
+            logger.warning("Error parsing Java in %s: %s", file_path, e)
             # Fallback to regex-based parsing
             self._process_java_fallback(file_path, code)
 
     def _process_java_fallback(self, file_path: str, code: str) -> None:
-        # Fallback regex patterns for Java
-        patterns = {
-            'function': r'(?:public|private|protected)?\s+(?:static\s+)?[\w<>\[\],\s]+\s+([a-zA-Z_]\w*)\s*\([^)]*\)\s*(?:throws\s+[\w\s,]+)?\s*{',
-            'class': r'(?:public|private|protected)?\s+class\s+([a-zA-Z_]\w*)\s*(?:extends\s+[a-zA-Z_]\w*)?(?:\s+implements\s+[a-zA-Z_]\w*(?:\s*,\s*[a-zA-Z_]\w*)*)?\s*{',
-            'comment': r'//.*$|/\*[\s\S]*?\*/'
-        }
-        
-        # Process with regex
-        self._process_with_regex(file_path, code, "java", patterns)
+        self._process_with_regex(file_path, code, "java", _JAVA_FALLBACK_PATTERNS)
 
     def process_c_cpp(self, file_path: str, code: str, language: str) -> None:
-        if language == 'cpp' and CLANG_AVAILABLE:
+        if TREE_SITTER_AVAILABLE and self._process_with_tree_sitter(file_path, code, language):
+            return
+
+        if language == 'cpp' and CLANG_AVAILABLE and _clang_index() is not None:
             self._process_cpp_with_clang(file_path, code)
             return
         
@@ -489,13 +1003,11 @@ class CodeChunker:
             # This is a simplified approach and may not work for all C/C++ code
             
             # Remove preprocessor directives and comments for parsing
-            preprocessed_code = re.sub(r'#.*?(?:\n|$)', '\n', code)
-            preprocessed_code = re.sub(r'//.*?(?:\n|$)', '\n', preprocessed_code)
-            preprocessed_code = re.sub(r'/\*.*?\*/', '', preprocessed_code, flags=re.DOTALL)
+            preprocessed_code = _C_PREPROC_AND_COMMENTS.sub(_strip_c_preproc_or_comment, code)
             
             # Parse the code
-            parser = c_parser.CParser()
-            ast = parser.parse(preprocessed_code, filename=file_path)
+            ast = self._parse('c', preprocessed_code,
+                              lambda src: c_parser.CParser().parse(src, filename=file_path))
             
             # Extract functions and structs/classes
             functions = []
@@ -520,55 +1032,42 @@ class CodeChunker:
             # Map AST nodes to original code positions
             # This is approximate since pycparser doesn't provide source positions
             all_nodes = []
+            newlines = self._newline_offsets(code)
+            match_brace = self._brace_matcher(code)
+            
+            # First position of each 'name(...) {' and 'struct name {' in the
+            # original code, found in one pass per pattern
+            function_starts = self._first_match_starts(_C_FUNCTION_HEADER, code)
+            struct_starts = self._first_match_starts(_C_STRUCT_HEADER, code)
             
             for node in functions:
                 if hasattr(node, 'decl') and hasattr(node.decl, 'name'):
-                    func_name = node.decl.name
                     # Find function in original code
-                    pattern = r'\b' + re.escape(func_name) + r'\s*\([^)]*\)\s*{'
-                    match = re.search(pattern, code)
-                    if match:
-                        start_pos = match.start()
+                    start_pos = function_starts.get(node.decl.name)
+                    if start_pos is not None:
                         # Find the end by matching braces
-                        open_braces = 0
-                        close_braces = 0
-                        for i, char in enumerate(code[start_pos:]):
-                            if char == '{':
-                                open_braces += 1
-                            elif char == '}':
-                                close_braces += 1
-                                if open_braces == close_braces:
-                                    end_pos = start_pos + i + 1
-                                    start_line = code.count('\n', 0, start_pos) + 1
-                                    end_line = code.count('\n', 0, end_pos) + 1
-                                    all_nodes.append(('function', start_line, end_line, start_pos, end_pos))
-                                    break
+                        close_pos = match_brace(start_pos)
+                        if close_pos != -1:
+                            end_pos = close_pos + 1
+                            start_line = self._line_at(newlines, start_pos)
+                            end_line = self._line_at(newlines, end_pos)
+                            all_nodes.append(('function', start_line, end_line, start_pos, end_pos))
             
             for node in structs:
                 if hasattr(node, 'name') and node.name:
-                    struct_name = node.name
                     # Find struct/class in original code
-                    pattern = r'(?:struct|class|union)\s+' + re.escape(struct_name) + r'\s*{'
-                    match = re.search(pattern, code)
-                    if match:
-                        start_pos = match.start()
+                    start_pos = struct_starts.get(node.name)
+                    if start_pos is not None:
                         # Find the end by matching braces
-                        open_braces = 0
-                        close_braces = 0
-                        for i, char in enumerate(code[start_pos:]):
-                            if char == '{':
-                                open_braces += 1
-                            elif char == '}':
-                                close_braces += 1
-                                if open_braces == close_braces:
-                                    end_pos = start_pos + i + 1
-                                    start_line = code.count('\n', 0, start_pos) + 1
-                                    end_line = code.count('\n', 0, end_pos) + 1
-                                    all_nodes.append(('struct', start_line, end_line, start_pos, end_pos))
-                                    break
+                        close_pos = match_brace(start_pos)
+                        if close_pos != -1:
+                            end_pos = close_pos + 1
+                            start_line = self._line_at(newlines, start_pos)
+                            end_line = self._line_at(newlines, end_pos)
+                            all_nodes.append(('struct', start_line, end_line, start_pos, end_pos))
             
             # Sort by start position
-            all_nodes.sort(key=lambda x: x[3])
+            all_nodes.sort(key=itemgetter(3))
             
             # Process chunks
             previous_end = 0
@@ -578,8 +1077,8 @@ class CodeChunker:
                 if start_pos > previous_end:
                     global_code = code[previous_end:start_pos]
                     if global_code.strip():
-                        global_start_line = code.count('\n', 0, previous_end) + 1
-                        global_end_line = code.count('\n', 0, start_pos) + 1
+                        global_start_line = self._line_at(newlines, previous_end)
+                        global_end_line = self._line_at(newlines, start_pos)
                         self.chunk_counter += 1
                         self.store_chunk(
                             file_path, 
@@ -611,8 +1110,8 @@ class CodeChunker:
             if previous_end < len(code):
                 global_code = code[previous_end:]
                 if global_code.strip():
-                    start_line = code.count('\n', 0, previous_end) + 1
-                    end_line = code.count('\n', 0, len(code)) + 1
+                    start_line = self._line_at(newlines, previous_end)
+                    end_line = self._line_at(newlines, len(code))
                     self.chunk_counter += 1
                     self.store_chunk(
                         file_path, 
@@ -625,95 +1124,58 @@ class CodeChunker:
                     )
                     
         except Exception as e:
-            print(f"Error parsing {language} in {file_path}: {e}")
+            logger.warning("Error parsing %s in %s: %s", language, file_path, e)
             # Fallback to regex-based parsing
             self._process_c_cpp_fallback(file_path, code, language)
     def _process_c_cpp_fallback(self, file_path: str, code: str, language: str) -> None:
-        # Fallback regex patterns for C/C++
-        if language == 'c':
-            patterns = {
-                'function': r'\b[a-zA-Z_][a-zA-Z0-9_]*\s+\**([a-zA-Z_][a-zA-Z0-9_]*)\s*\([^)]*\)\s*{',
-                'struct': r'struct\s+([a-zA-Z_]\w*)\s*{',
-                'union': r'union\s+([a-zA-Z_]\w*)\s*{',
-                'comment': r'//.*$|/\*[\s\S]*?\*/'
-            }
-        else:  # cpp
-            patterns = {
-                'function': r'(?:virtual\s+|static\s+|inline\s+)?\b(?:[a-zA-Z_][a-zA-Z0-9_:<>]*(?:::[a-zA-Z_][a-zA-Z0-9_:<>]*)*)\s+\**(?:[a-zA-Z_][a-zA-Z0-9_]*(?:::[a-zA-Z_][a-zA-Z0-9_]*)*)?\s*\([^)]*\)\s*(?:const|noexcept|override|final|throw\([^)]*\))?\s*(?:->.*?)?\s*{',
-                'class': r'(?:class|struct)\s+([a-zA-Z_]\w*)\s*(?:final|sealed)?(?:\s*:\s*(?:public|private|protected)?\s+[a-zA-Z_][a-zA-Z0-9_:<>]*(?:\s*,\s*(?:public|private|protected)?\s+[a-zA-Z_][a-zA-Z0-9_:<>]*)*)?(?:\s*\{)',
-                'namespace': r'namespace\s+(?:[a-zA-Z_]\w*)\s*\{',
-                'template': r'template\s*<[^>]*>\s*(?:class|struct|typename)\s+([a-zA-Z_]\w*)\s*(?::[^{]*)?{',
-                'comment': r'//.*$|/\*[\s\S]*?\*/'
-            }
-        
-        # Process with regex
+        patterns = _C_FALLBACK_PATTERNS if language == 'c' else _CPP_FALLBACK_PATTERNS
         self._process_with_regex(file_path, code, language, patterns)
 
     
     def _process_cpp_with_clang(self, file_path: str, code: str) -> None:
         """Process C++ code using clang."""
         try:
-            # Create a temporary file with the code
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix='.cpp', delete=False, mode='w') as temp_file:
-                temp_file.write(code)
-                temp_path = temp_file.name
-            
-            # Parse the file with clang
-            index = clang.cindex.Index.create()
-            tu = index.parse(temp_path)
+            # Parse the in-memory source; clang reads it as an unsaved file, so
+            # nothing is written to disk. Bodies are kept (no
+            # PARSE_SKIP_FUNCTION_BODIES) because function extents need them.
+            source_path = file_path or 'mem.cpp'
+            tu = _clang_translation_unit(source_path, code)
             
             # Extract functions, classes, structs, and namespaces
             all_nodes = []
             
-            def visit_node(node, parent=None):
-                if node.location.file and node.location.file.name == temp_path:
-                    if node.kind in [
-                        clang.cindex.CursorKind.FUNCTION_DECL,
-                        clang.cindex.CursorKind.CXX_METHOD,
-                        clang.cindex.CursorKind.CONSTRUCTOR,
-                        clang.cindex.CursorKind.DESTRUCTOR,
-                        clang.cindex.CursorKind.CLASS_DECL,
-                        clang.cindex.CursorKind.STRUCT_DECL,
-                        clang.cindex.CursorKind.NAMESPACE,
-                        clang.cindex.CursorKind.CLASS_TEMPLATE
-                    ]:
-                        # Get the source range
-                        start_line = node.extent.start.line
-                        end_line = node.extent.end.line
-                        start_offset = node.extent.start.offset
-                        end_offset = node.extent.end.offset
-                        
-                        # Determine node type
-                        if node.kind in [clang.cindex.CursorKind.FUNCTION_DECL, 
-                                        clang.cindex.CursorKind.CXX_METHOD,
-                                        clang.cindex.CursorKind.CONSTRUCTOR,
-                                        clang.cindex.CursorKind.DESTRUCTOR]:
-                            node_type = 'function'
-                        elif node.kind in [clang.cindex.CursorKind.CLASS_DECL, 
-                                        clang.cindex.CursorKind.STRUCT_DECL,
-                                        clang.cindex.CursorKind.CLASS_TEMPLATE]:
-                            node_type = 'class'
-                        else:
-                            node_type = 'namespace'
-                        
-                        all_nodes.append((node_type, start_line, end_line, start_offset, end_offset))
+            # Walk the cursor tree with an explicit stack, in source order.
+            # Top-level declarations pulled in from headers are dropped with
+            # their whole subtree; everything below the rest is in this file.
+            stack = [child for child in tu.cursor.get_children()
+                     if _clang_file_name(child) in (None, source_path)]
+            stack.reverse()
+            while stack:
+                node = stack.pop()
+                node_type = _CLANG_CHUNK_TYPES.get(node._kind_id)
+                if node_type and _clang_file_name(node) == source_path:
+                    # Get the source range
+                    extent = node.extent
+                    all_nodes.append((node_type, extent.start.line, extent.end.line,
+                                      extent.start.offset, extent.end.offset))
                 
                 # Visit children
-                for child in node.get_children():
-                    visit_node(child, node)
-            
-            # Start traversal from the translation unit
-            visit_node(tu.cursor)
+                children = list(node.get_children())
+                children.reverse()
+                stack.extend(children)
+            _clang_keep_translation_unit(source_path, tu)
             
             # Sort nodes by start position
-            all_nodes.sort(key=lambda x: x[3])
+            all_nodes.sort(key=itemgetter(3))
             
-            # Process chunks
+            # Process chunks. Global chunks take their lines from the clang
+            # extents around them: they start on the line the previous node
+            # ended on and end on the line the next one starts on.
             previous_end = 0
+            previous_end_line = 1
             
             for node_type, start_line, end_line, start_offset, end_offset in all_nodes:
-                # Map offsets from temp file to original code
+                # Clamp clang offsets to the in-memory source
                 start_pos = min(start_offset, len(code) - 1)
                 end_pos = min(end_offset, len(code))
                 
@@ -721,8 +1183,8 @@ class CodeChunker:
                 if start_pos > previous_end:
                     global_code = code[previous_end:start_pos]
                     if global_code.strip():
-                        global_start_line = code.count('\n', 0, previous_end) + 1
-                        global_end_line = code.count('\n', 0, start_pos) + 1
+                        global_start_line = previous_end_line
+                        global_end_line = start_line
                         self.chunk_counter += 1
                         self.store_chunk(
                             file_path, 
@@ -749,13 +1211,14 @@ class CodeChunker:
                     )
                 
                 previous_end = end_pos
+                previous_end_line = end_line
             
             # Add any remaining code as a global chunk
             if previous_end < len(code):
                 global_code = code[previous_end:]
                 if global_code.strip():
-                    start_line = code.count('\n', 0, previous_end) + 1
-                    end_line = code.count('\n', 0, len(code)) + 1
+                    start_line = previous_end_line
+                    end_line = code.count('\n') + 1
                     self.chunk_counter += 1
                     self.store_chunk(
                         file_path, 
@@ -767,54 +1230,166 @@ class CodeChunker:
                         "cpp"
                     )
             
-            # Clean up the temporary file
-            import os
-            os.unlink(temp_path)
-            
         except Exception as e:
-            print(f"Error parsing C++ with clang in {file_path}: {e}")
+            logger.warning("Error parsing C++ with clang in %s: %s", file_path, e)
             # Fallback to regex-based parsing
             self._process_c_cpp_fallback(file_path, code, "cpp")
 
     
+    def _byte_to_char_offsets(self, code: str):
+        """Return a function mapping UTF-8 byte offsets in code to character offsets."""
+        if code.isascii():
+            return lambda offset: offset
+        if NUMPY_AVAILABLE:
+            points = np.frombuffer(code.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+            widths = 1 + (points >= 0x80).astype(np.int64) + (points >= 0x800) + (points >= 0x10000)
+            char_starts = np.concatenate(([0], np.cumsum(widths)))
+            return lambda offset: int(np.searchsorted(char_starts, offset))
+        char_starts = [0]
+        for ch in code:
+            char_starts.append(char_starts[-1] + len(ch.encode('utf-8', 'surrogatepass')))
+        return lambda offset: bisect_left(char_starts, offset)
+
+    def _extract_spans_ts(self, code: str, language: str, file_path: str = None) -> List[Tuple[int, int, int, int, str]]:
+        """Definition spans as (start_byte, end_byte, start_line, end_line, chunk_type), sorted.
+
+        With file_path, the tree is kept so the next parse of that path is incremental.
+        """
+        parser = self._ts_parsers.get(language)
+        if parser is None:
+            parser = self._ts_parsers[language] = get_parser(language)
+        source = code.encode('utf-8', 'surrogatepass')
+        tree = _ts_parse(parser, language, file_path, source)
+
+        spans = []
+        for node, capture in _ts_query(language).captures(tree.root_node):
+            if language == 'python' and _ts_inside_python_function(node):
+                continue
+            if capture == 'decorated_definition':
+                # Chunk the decorators with the function/class they wrap.
+                definition = node.child_by_field_name('definition')
+                if definition is None:
+                    continue
+                chunk_type = _TS_DEFINITIONS['python'].get(definition.type)
+            elif capture == 'variable_declarator':
+                chunk_type = 'function'
+            else:
+                if node.parent is not None and node.parent.type == 'decorated_definition':
+                    continue
+                chunk_type = _TS_DEFINITIONS[language][capture]
+            if chunk_type:
+                spans.append((node.start_byte, node.end_byte,
+                              node.start_point[0] + 1, node.end_point[0] + 1, chunk_type))
+        spans.sort()
+        _ts_keep_tree(language, file_path, source, tree)
+        return spans
+
+    def _process_with_tree_sitter(self, file_path: str, code: str, language: str) -> bool:
+        """Chunk code with tree-sitter; returns False if it could not be parsed."""
+        try:
+            spans = self._extract_spans_ts(code, language, file_path)
+        except Exception as e:
+            logger.warning("Error parsing %s with tree-sitter in %s: %s", language, file_path, e)
+            return False
+
+        to_char = self._byte_to_char_offsets(code)
+        # Only needed for non-blank global chunks
+        newlines = _lazy(self._newline_offsets, code)
+        previous_end = 0
+        for start_byte, end_byte, start_line, end_line, chunk_type in spans:
+            start, end = to_char(start_byte), to_char(end_byte)
+
+            # Add global code before this definition if any
+            if start > previous_end:
+                global_code = code[previous_end:start]
+                if global_code.strip():
+                    self.chunk_counter += 1
+                    self.store_chunk(
+                        file_path,
+                        f"{language}_global_{self.chunk_counter}",
+                        global_code,
+                        self._line_at(newlines(), previous_end),
+                        self._line_at(newlines(), start),
+                        (previous_end, start),
+                        language
+                    )
+
+            self.chunk_counter += 1
+            self.store_chunk(
+                file_path,
+                f"{language}_{chunk_type}_{self.chunk_counter}",
+                code[start:end],
+                start_line,
+                end_line,
+                (start, end),
+                language
+            )
+            # Nested definitions end inside their parent; don't rewind.
+            previous_end = max(previous_end, end)
+
+        # Add any remaining code as a global chunk
+        if previous_end < len(code):
+            global_code = code[previous_end:]
+            if global_code.strip():
+                self.chunk_counter += 1
+                self.store_chunk(
+                    file_path,
+                    f"{language}_global_{self.chunk_counter}",
+                    global_code,
+                    self._line_at(newlines(), previous_end),
+                    self._line_at(newlines(), len(code)),
+                    (previous_end, len(code)),
+                    language
+                )
+        return True
+
     def _process_with_regex(self, file_path: str, code: str, language: str, patterns: Dict) -> None:
-        """Process code using regex patterns for the given language."""
-        # Remove comments to avoid false positives
-        if 'comment' in patterns:
-            code_without_comments = re.sub(patterns['comment'], '', code, flags=re.MULTILINE)
+        """Process code using regex patterns for the given language.
+
+        Patterns may be strings (compiled with re.MULTILINE) or compiled patterns.
+        """
+        patterns = {name: pattern if isinstance(pattern, re.Pattern) else re.compile(pattern, re.MULTILINE)
+                    for name, pattern in patterns.items() if pattern}
+        # Remove comments to avoid false positives; definitions found in the
+        # stripped text are mapped back to offsets in code
+        comment_spans = [match.span() for match in patterns['comment'].finditer(code)] if 'comment' in patterns else []
+        if comment_spans:
+            code_without_comments, to_original = _strip_spans(code, comment_spans)
         else:
-            code_without_comments = code
+            code_without_comments, to_original = code, None
             
-        # Find all definitions
+        # Find all definitions in one pass; the named group says which kind matched
         definitions = []
-        
-        for def_type, pattern in patterns.items():
-            if def_type == 'comment':
-                continue
-                
-            if pattern:
-                for match in re.finditer(pattern, code_without_comments, re.MULTILINE):
-                    start_pos = match.start()
-                    # Find the opening brace
-                    open_brace_pos = code_without_comments.find('{', start_pos)
-                    if open_brace_pos != -1:
-                        # Find the matching closing brace
-                        close_brace_pos = self._find_matching_brace(code_without_comments, open_brace_pos + 1)
-                        if close_brace_pos != -1:
-                            definitions.append((start_pos, close_brace_pos, def_type))
+        definition_pattern = _definition_pattern(
+            patterns, long_lines=(RE2_AVAILABLE or REGEX_AVAILABLE) and _has_long_line(code_without_comments, RE2_MIN_LINE))
+
+        if definition_pattern is not None:
+            match_brace = _lazy(self._brace_matcher, code_without_comments)
+            for match in _finditer_bounded(definition_pattern, code_without_comments, file_path):
+                start_pos = match.start()
+                # Find the opening brace
+                open_brace_pos = code_without_comments.find('{', start_pos)
+                if open_brace_pos != -1:
+                    # Find the matching closing brace; the chunk ends just after it
+                    close_brace_pos = match_brace()(open_brace_pos)
+                    if close_brace_pos != -1:
+                        if to_original is not None:
+                            start_pos, close_brace_pos = to_original(start_pos), to_original(close_brace_pos)
+                        definitions.append((start_pos, close_brace_pos + 1, match.lastgroup))
         
         # Sort definitions by start position
-        definitions.sort(key=lambda x: x[0])
+        definitions.sort(key=itemgetter(0))
         
         # Process chunks
+        newlines = self._newline_offsets(code)
         previous_end = 0
         for start, end, def_type in definitions:
             # Add global code before this definition if any
             if start > previous_end:
                 global_code = code[previous_end:start]
                 if global_code.strip():
-                    start_line = code.count('\n', 0, previous_end) + 1
-                    end_line = code.count('\n', 0, start) + 1
+                    start_line = self._line_at(newlines, previous_end)
+                    end_line = self._line_at(newlines, start)
                     self.chunk_counter += 1
                     self.store_chunk(
                         file_path, 
@@ -828,8 +1403,8 @@ class CodeChunker:
             
             # Add the definition
             chunk_code = code[start:end]
-            start_line = code.count('\n', 0, start) + 1
-            end_line = code.count('\n', 0, end) + 1
+            start_line = self._line_at(newlines, start)
+            end_line = self._line_at(newlines, end)
             self.chunk_counter += 1
             chunk_type = 'class' if def_type in ('class', 'struct', 'union') else def_type
             self.store_chunk(
@@ -848,8 +1423,8 @@ class CodeChunker:
         if previous_end < len(code):
             global_code = code[previous_end:]
             if global_code.strip():
-                start_line = code.count('\n', 0, previous_end) + 1
-                end_line = code.count('\n', 0, len(code)) + 1
+                start_line = self._line_at(newlines, previous_end)
+                end_line = self._line_at(newlines, len(code))
                 self.chunk_counter += 1
                 self.store_chunk(
                     file_path, 
@@ -861,82 +1436,148 @@ class CodeChunker:
                     language
                 )
 
-    def _find_matching_brace(self, code: str, start_pos: int) -> int:
-        """Find the matching closing brace for an opening brace."""
-        stack = 1
-        pos = start_pos
-        
-        while pos < len(code) and stack > 0:
-            if code[pos] == '{':
-                stack += 1
-            elif code[pos] == '}':
-                stack -= 1
-            pos += 1
-            
-        return pos if stack == 0 else -1
+    def process_code(self, file_path: str, code: str, language: str = None) -> List[CodeChunk]:
+        """Process code and extract chunks based on language.
 
-    def process_code(self, file_path: str, code: str) -> List[Dict]:
-        """Process code and extract chunks based on language."""
+        language is detected from file_path unless the caller already has it.
+        """
         self.code_chunks = []  # Reset chunks for new file
         self.chunk_counter = 0
+        self._newlines = None
         
-        language = self.detect_language(file_path)
+        if language is None:
+            language = self.detect_language(file_path)
         if language == 'unknown':
             return []
 
-        if language == 'python':
-            self.process_python(file_path, code)
-        elif language in ['javascript', 'jsx']:
-            self.process_javascript(file_path, code)
-        elif language == 'java':
-            self.process_java(file_path, code)
-        elif language in ['c', 'cpp']:
-            self.process_c_cpp(file_path, code, language)
+        keywords = _DEFINITION_KEYWORDS.get(language)
+        if keywords and not any(keyword in code for keyword in keywords):
+            # Nothing any parser could chunk as a definition; skip parsing
+            if code.strip():
+                self.chunk_counter += 1
+                self.store_chunk(
+                    file_path,
+                    f"{language}_global_{self.chunk_counter}",
+                    code,
+                    1,
+                    code.count('\n') + 1,
+                    (0, len(code)),
+                    language
+                )
+            return self.code_chunks
+
+        cache_path = None
+        if self.cache_dir:
+            cache_path = os.path.join(self.cache_dir, _chunk_cache_key(language, code, self.top_level_only) + '.json')
+            if self._load_cached_chunks(cache_path, file_path):
+                return self.code_chunks
+
+        handler = self._language_handlers.get(language)
+        if handler is not None:
+            handler(file_path, code)
         else:
-            print(f"Warning: Language '{language}' is recognized but not fully supported.")
+            logger.warning("Language '%s' is recognized but not fully supported.", language)
             # Try to use regex-based fallback for other languages
-            self._process_with_regex(file_path, code, language, {
-                'function': r'\b\w+\s+\w+\s*\([^)]*\)\s*{',
-                'class': r'(?:class|struct)\s+\w+\s*{',
-                'comment': r'//.*$|/\*[\s\S]*?\*/'
-            })
+            self._process_with_regex(file_path, code, language, _GENERIC_PATTERNS)
 
+        if self.top_level_only:
+            self.code_chunks = _outermost_chunks(self.code_chunks)
+        self._newlines = None
+        if cache_path:
+            self._save_cached_chunks(cache_path)
         return self.code_chunks
 
+    def _load_cached_chunks(self, cache_path: str, file_path: str) -> bool:
+        try:
+            with open(cache_path, 'rb') as f:
+                cached = orjson.loads(f.read())
+            # Cached chunks are keyed by content, so take the path from this call
+            chunks = [
+                CodeChunk(chunk_id, file_path, code, start_line, end_line, tuple(byte_range), sys.intern(language))
+                for chunk_id, code, start_line, end_line, byte_range, language in cached['chunks']
+            ]
+            counter = cached['counter']
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Ignoring unreadable chunk cache %s: %s", cache_path, e)
+            return False
+        self.code_chunks = chunks
+        self.chunk_counter = counter
+        return True
+
+    def _save_cached_chunks(self, cache_path: str) -> None:
+        body = orjson.dumps({
+            'counter': self.chunk_counter,
+            'chunks': [(c.chunk_id, c.code, c.start_line, c.end_line, c.byte_range, c.language)
+                       for c in self.code_chunks],
+        })
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to a temp file and rename, so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning("Could not write chunk cache %s: %s", cache_path, e)
+
+    def process_files(self, file_paths: List[str], max_workers: int = None) -> List[CodeChunk]:
+        """Chunk many files across a process pool, appending to self.code_chunks.
+
+        Each worker chunks its files with one CodeChunker of its own (see
+        process_file); the per-file IDs are then renumbered here, in file order,
+        so they stay unique across the batch.
+        """
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as ex:
+            for chunks in ex.map(process_file, file_paths, chunksize=8):
+                for chunk in chunks:
+                    self.chunk_counter += 1
+                    prefix = chunk.chunk_id.rsplit('_', 1)[0]
+                    self.code_chunks.append(dataclasses.replace(
+                        chunk, chunk_id=f"{prefix}_{self.chunk_counter}", language=sys.intern(chunk.language)))
+        return self.code_chunks
+
+
+# Per-process chunker for process_files workers, so each worker sets up its
+# parsers once rather than once per file. Unset in other processes, where
+# process_file may be called from several threads.
+_worker_chunker = None
+
+def _init_worker() -> None:
+    global _worker_chunker
+    _worker_chunker = CodeChunker()
 
-def process_file(file_path: str) -> List[Dict]:
+def process_file(file_path: str) -> List[CodeChunk]:
     """Process a single file and return code chunks with error handling."""
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             code = f.read()
 
         if not code.strip():
-            print(f"⚠️ Error: The file '{file_path}' is empty or contains only whitespace.")
+            logger.warning("The file '%s' is empty or contains only whitespace.", file_path)
             return []
 
-        chunker = CodeChunker()
+        chunker = _worker_chunker or CodeChunker()
         chunks = chunker.process_code(file_path, code)
 
         if not chunks:
             language = chunker.detect_language(file_path)
             if language == "unknown":
-                print(f"⚠️ Error: Unable to detect the language for '{file_path}'. Unsupported file extension.")
+                logger.warning("Unable to detect the language for '%s'. Unsupported file extension.", file_path)
             else:
-                print(f"⚠️ Warning: No chunks detected in '{file_path}'.")
-                print("   Possible reasons:")
-                print("   - The file might not contain class/function definitions.")
-                print("   - The AST-based chunking might not fully support this file format.")
-                print("   - The file uses an uncommon syntax that the parser doesn't recognize.")
+                # It may have no class/function definitions, or syntax the parser doesn't recognize
+                logger.warning("No chunks detected in '%s'.", file_path)
             return []
 
         return chunks
 
     except FileNotFoundError:
-        print(f"❌ Error: The file '{file_path}' was not found.")
+        logger.error("The file '%s' was not found.", file_path)
         return []
     except PermissionError:
-        print(f"❌ Error: Insufficient permissions to read the file '{file_path}'.")
+        logger.error("Insufficient permissions to read the file '%s'.", file_path)
         return []
     except Exception as e:
-        print(f"❌ Unexpected error processing '{file_path}': {str(e)}")
+        logger.exception("Unexpected error processing '%s'", file_path)
         return []
\ No newline at end of file
@@ -0,0 +1,18 @@
+import os
+import threading
+import chromadb
+
+# One PersistentClient per on-disk store, shared by ingestion and search so the
+# index is loaded once per process rather than once per engine.
+_CLIENTS = {}
+_clients_lock = threading.Lock()
+
+def get_client(chroma_path):
+    """Return the process-wide PersistentClient for chroma_path, opening it on first use."""
+    key = os.path.abspath(chroma_path)
+    with _clients_lock:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = chromadb.PersistentClient(path=key)
+            _CLIENTS[key] = client
+        return client
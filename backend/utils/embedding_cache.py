@@ -0,0 +1,51 @@
+import hashlib
+import sqlite3
+from contextlib import closing
+import numpy as np
+
+# Keys per SELECT ... IN (...), under SQLite's bound-parameter limit
+LOOKUP_BATCH = 500
+
+def model_key(embedding_model):
+    """``model_name:backend`` of a CodeEmbeddingModel; vectors from different keys don't mix."""
+    return f"{getattr(embedding_model, 'model_name', '')}:{getattr(embedding_model, 'backend', '')}"
+
+def _key(model_key, text):
+    return hashlib.blake2b(f"{model_key}\0{text}".encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+def embed_with_cache(cache_path, embedding_model, texts, batch_size=64):
+    """Normalized embeddings for texts, one row each, embedding only unseen text.
+
+    Vectors are kept in a SQLite file at cache_path keyed by a hash of the
+    model (name and backend) and the text, so identical code is embedded once
+    per model: within this call and across runs. They are stored as float32,
+    so a cached row is the same vector a fresh embedding would have given.
+    """
+    key = model_key(embedding_model)
+    keys = [_key(key, text) for text in texts]
+
+    with closing(sqlite3.connect(cache_path)) as conn:
+        conn.execute('CREATE TABLE IF NOT EXISTS embeddings(key BLOB PRIMARY KEY, vector BLOB)')
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), LOOKUP_BATCH):
+            batch = unique_keys[start:start + LOOKUP_BATCH]
+            rows = conn.execute(f'SELECT key, vector FROM embeddings WHERE key IN ({",".join("?" * len(batch))})',
+                                batch)
+            found.update((key, np.frombuffer(vector, dtype='float32')) for key, vector in rows)
+
+        # Each distinct missing text goes to the model once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = np.asarray(embedding_model.generate_embeddings(list(missing.values()), batch_size=batch_size,
+                                                                     normalize=True), dtype='float32')
+            found.update(zip(missing, vectors))
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO embeddings(key, vector) VALUES(?, ?)',
+                                 ((key, vector.tobytes()) for key, vector in zip(missing, vectors)))
+
+    print(f"Embedded {len(missing)} chunks, reused {len(texts) - len(missing)} cached or duplicate ones")
+    return np.stack([found[key] for key in keys])
@@ -0,0 +1,156 @@
+import os
+import numpy as np
+import orjson
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+EMBEDDINGS_FILE = "embeddings.npy"
+# Vectors are kept as float16, on disk and inside the index: unit-length
+# embeddings lose nothing measurable for ranking, and it halves their size.
+EMBEDDINGS_DTYPE = 'float16'
+METADATA_FILE = "embeddings_meta.json"
+INDEX_FILE = "faiss.index"
+
+# Below this many vectors a flat (brute-force) index is fast enough; above it the
+# index is HNSW, trading a little recall for sub-linear query time.
+HNSW_MIN_VECTORS = 100_000
+HNSW_NEIGHBORS = 32
+HNSW_EF_SEARCH = 64
+
+def save_vectors(storage_dir, embeddings, metadatas):
+    """Dump the ingested vectors and their metadata next to code_chunks.json.
+
+    Rows must be L2-normalized so that inner product equals cosine similarity.
+    An index built from earlier vectors is removed; FaissIndex.load rebuilds it.
+    """
+    try:
+        os.remove(os.path.join(storage_dir, INDEX_FILE))
+    except FileNotFoundError:
+        pass
+    with open(os.path.join(storage_dir, METADATA_FILE), 'wb') as f:
+        f.write(orjson.dumps(metadatas))
+    np.save(os.path.join(storage_dir, EMBEDDINGS_FILE), np.asarray(embeddings, dtype=EMBEDDINGS_DTYPE))
+
+def _build_index(vectors):
+    vectors = np.asarray(vectors, dtype='float32')
+    if len(vectors) < HNSW_MIN_VECTORS:
+        index = faiss.IndexScalarQuantizer(vectors.shape[1], faiss.ScalarQuantizer.QT_fp16,
+                                           faiss.METRIC_INNER_PRODUCT)
+    else:
+        index = faiss.IndexHNSWSQ(vectors.shape[1], faiss.ScalarQuantizer.QT_fp16, HNSW_NEIGHBORS,
+                                  faiss.METRIC_INNER_PRODUCT)
+    # fp16 needs no training, but the quantizer must be marked trained
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+def remove_vectors(storage_dir):
+    """Delete the dumped vectors, metadata and index, where present."""
+    for name in (EMBEDDINGS_FILE, METADATA_FILE, INDEX_FILE):
+        try:
+            os.remove(os.path.join(storage_dir, name))
+        except FileNotFoundError:
+            pass
+
+class FaissStore:
+    """Write side of the FAISS backend, used in place of Chroma for bulk ingests.
+
+    add() only buffers rows; save() writes them with save_vectors and builds
+    the index in one call, so no per-insert graph maintenance is paid.
+    """
+
+    def __init__(self, storage_dir):
+        self.storage_dir = storage_dir
+        self._vectors = []
+        self.metadatas = []
+
+    def add(self, embeddings, metadatas):
+        self._vectors.append(np.asarray(embeddings, dtype='float32'))
+        self.metadatas.extend(metadatas)
+
+    def __len__(self):
+        return len(self.metadatas)
+
+    def save(self):
+        vectors = np.concatenate(self._vectors) if self._vectors else np.empty((0, 0), dtype='float32')
+        save_vectors(self.storage_dir, vectors, self.metadatas)
+        if FAISS_AVAILABLE and len(vectors):
+            # Written after the .npy, so FaissIndex.load takes it as current
+            faiss.write_index(_build_index(vectors), os.path.join(self.storage_dir, INDEX_FILE))
+
+def vectors_stamp(storage_dir):
+    """mtimes of the dumped vectors, metadata and index (None where missing), so
+    callers holding a loaded FaissIndex can tell when ingest has replaced them."""
+    stamp = []
+    for name in (EMBEDDINGS_FILE, METADATA_FILE, INDEX_FILE):
+        try:
+            stamp.append(os.stat(os.path.join(storage_dir, name)).st_mtime_ns)
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+class FaissIndex:
+    """Inner-product index over the vectors written by save_vectors: brute force
+    for small projects, HNSW from HNSW_MIN_VECTORS up, both over fp16 codes."""
+
+    def __init__(self, index, metadatas):
+        self.index = index
+        self.metadatas = metadatas
+
+    @classmethod
+    def load(cls, storage_dir):
+        """Load (or build and persist) the index for storage_dir; None if unavailable."""
+        if not FAISS_AVAILABLE:
+            return None
+        npy_path = os.path.join(storage_dir, EMBEDDINGS_FILE)
+        meta_path = os.path.join(storage_dir, METADATA_FILE)
+        index_path = os.path.join(storage_dir, INDEX_FILE)
+        if not (os.path.exists(npy_path) and os.path.exists(meta_path)):
+            return None
+
+        with open(meta_path, 'rb') as f:
+            metadatas = orjson.loads(f.read())
+
+        if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(npy_path):
+            index = faiss.read_index(index_path)
+        else:
+            index = _build_index(np.load(npy_path))
+            faiss.write_index(index, index_path)
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+
+        if index.ntotal != len(metadatas):
+            return None
+        return cls(index, metadatas)
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def query(self, query_embeddings, n_results=10, include=("metadatas",)):
+        """Search the index, returning a dict shaped like Chroma's collection.query().
+
+        Distances are squared L2 (``2 - 2 * inner_product`` for unit vectors),
+        matching Chroma's default space.
+        """
+        queries = np.asarray(query_embeddings, dtype='float32')
+        k = min(n_results, self.index.ntotal)
+        params = None
+        if isinstance(self.index, faiss.IndexHNSW) and k > HNSW_EF_SEARCH:
+            # HNSW returns at most efSearch hits. Passed per call: the index is
+            # shared by concurrent searches, so its own efSearch stays fixed.
+            params = faiss.SearchParametersHNSW(efSearch=k)
+        scores, indices = self.index.search(queries, k, params=params)
+        results = {"ids": [], "metadatas": [], "distances": []}
+        for row_scores, row_indices in zip(scores, indices):
+            hits = [(s, i) for s, i in zip(row_scores.tolist(), row_indices.tolist()) if i >= 0]
+            results["ids"].append([self.metadatas[i].get("chunk_id") for _, i in hits])
+            results["metadatas"].append([self.metadatas[i] for _, i in hits])
+            results["distances"].append([2.0 - 2.0 * s for s, _ in hits])
+        for key in ("metadatas", "distances"):
+            if key not in include:
+                del results[key]
+        return results
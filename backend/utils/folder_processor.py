@@ -1,17 +1,55 @@
 import os
 import sys
 from pathlib import Path
-import subprocess
-from typing import List, Dict, Optional
-from utils.TreeParser import CodeChunker
+import multiprocessing
+import itertools
+import orjson
+import logging
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, List, Optional
+from utils.TreeParser import CodeChunker, CodeChunk
 from utils.oswalker import find_files
-import utils.Store_Embedding
+
+logger = logging.getLogger(__name__)
+
+# process_folder reads this many files ahead of the one being parsed, on
+# READ_AHEAD_THREADS threads, so parsing does not wait on disk.
+READ_AHEAD = 16
+READ_AHEAD_THREADS = 8
+
+def _read_source(file_path: str) -> str:
+    # One binary read and decode, skipping the text layer's incremental
+    # decoding; newlines are then translated as text mode would have.
+    with open(file_path, 'rb') as f:
+        code = f.read().decode('utf-8')
+    if '\r' in code:
+        code = code.replace('\r\n', '\n').replace('\r', '\n')
+    return code
+
+# Below this many files process_folder_parallel parses in-process instead.
+PARALLEL_MIN_FILES = 32
+
+# Per-process parser for process_folder_parallel workers.
+_worker_processor = None
+
+def _init_worker(chunk_cache_dir: Optional[str], top_level_only: bool) -> None:
+    global _worker_processor
+    _worker_processor = FolderProcessor(chunk_cache_dir=chunk_cache_dir, top_level_only=top_level_only)
+
+def _parse_in_worker(file_path: str) -> List[CodeChunk]:
+    """Parse one file in a pool worker; chunk IDs are assigned by the parent."""
+    return _worker_processor.parse_file(file_path)
 
 class FolderProcessor:
-    def __init__(self):
+    def __init__(self, chunk_cache_dir: Optional[str] = None, top_level_only: bool = False):
         self.all_chunks = []
         self.global_chunk_counter = 0
-        self.chunker = CodeChunker()
+        # chunk_cache_dir keeps parsed chunks on disk by file content, and
+        # top_level_only drops nested definitions (see CodeChunker)
+        self.chunk_cache_dir = chunk_cache_dir
+        self.top_level_only = top_level_only
+        self.chunker = CodeChunker(cache_dir=chunk_cache_dir, top_level_only=top_level_only)
         
     def generate_unique_chunk_id(self, file_path: str, chunk_type: str) -> str:
         """Generate a unique chunk ID that includes file info and global counter."""
@@ -21,101 +59,155 @@ class FolderProcessor:
         # Create ID with format: filename_chunktype_globalcounter
         return f"{filename}_{chunk_type}_{self.global_chunk_counter}"
     
-    def process_single_file(self, file_path: str) -> List[Dict]:
+    def process_single_file(self, file_path: str, source: Optional[Future] = None) -> List[CodeChunk]:
         """Process a single file with unique chunk IDs."""
+        return self.assign_chunk_ids(file_path, self.parse_file(file_path, source))
+
+    def parse_file(self, file_path: str, source: Optional[Future] = None) -> List[CodeChunk]:
+        """Parse a single file into chunks carrying the chunker's own IDs.
+
+        source, if given, is a future already reading the file (see process_folder);
+        read errors surface from it and are reported the same way.
+        """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                code = f.read()
+            code = source.result() if source is not None else _read_source(file_path)
 
             if not code.strip():
-                print(f"⚠️ Error: The file '{file_path}' is empty or contains only whitespace.")
+                logger.debug("Skipping %s: empty or whitespace only", file_path)
                 return []
 
-            # Reset the chunker's internal counter since we're using our global counter
-            self.chunker.code_chunks = []
-            self.chunker.chunk_counter = 0
-            
             language = self.chunker.detect_language(file_path)
             if language == "unknown":
-                print(f"⚠️ Error: Unable to detect the language for '{file_path}'. Unsupported file extension.")
+                logger.debug("Skipping %s: unsupported file extension", file_path)
                 return []
                 
-            # Process the code based on language
-            if language == 'python':
-                self.chunker.process_python(file_path, code)
-            elif language in ['javascript', 'jsx']:
-                self.chunker.process_javascript(file_path, code)
-            elif language == 'java':
-                self.chunker.process_java(file_path, code)
-            elif language in ['c', 'cpp']:
-                self.chunker.process_c_cpp(file_path, code, language)
-            else:
-                print(f"Warning: Language '{language}' is recognized but not fully supported.")
-                self.chunker._process_with_regex(file_path, code, language, {
-                    'function': r'\b\w+\s+\w+\s*\([^)]*\)\s*{',
-                    'class': r'(?:class|struct)\s+\w+\s*{',
-                    'comment': r'//.*$|/\*[\s\S]*?\*/'
-                })
-            
-            # Replace chunk IDs with our unique IDs
-            chunks_with_unique_ids = []
-            for chunk in self.chunker.code_chunks:
-                # Extract chunk type from the original ID (e.g., "python_function_1" -> "function")
-                chunk_type = chunk['chunk_id'].split('_')[1] if '_' in chunk['chunk_id'] else 'unknown'
-                # Generate new unique ID
-                unique_id = self.generate_unique_chunk_id(file_path, chunk_type)
-                # Create new chunk with unique ID
-                new_chunk = chunk.copy()
-                new_chunk['chunk_id'] = unique_id
-                chunks_with_unique_ids.append(new_chunk)
+            # Process the code based on language; IDs are replaced by assign_chunk_ids
+            self.chunker.process_code(file_path, code, language)
             
-            if not chunks_with_unique_ids:
-                print(f"⚠️ Warning: No chunks detected in '{file_path}'.")
-            
-            return chunks_with_unique_ids
+            if not self.chunker.code_chunks:
+                logger.debug("No chunks detected in %s", file_path)
+
+            return self.chunker.code_chunks
 
         except FileNotFoundError:
-            print(f"❌ Error: The file '{file_path}' was not found.")
+            logger.warning("File %s was not found", file_path)
             return []
         except PermissionError:
-            print(f"❌ Error: Insufficient permissions to read the file '{file_path}'.")
+            logger.warning("Insufficient permissions to read %s", file_path)
             return []
         except Exception as e:
-            print(f"❌ Unexpected error processing '{file_path}': {str(e)}")
+            logger.warning("Unexpected error processing %s: %s", file_path, e)
             return []
+
+    def assign_chunk_ids(self, file_path: str, chunks: List[CodeChunk]) -> List[CodeChunk]:
+        """Replace the chunker's per-file IDs with globally unique ones.
+
+        The chunks are updated in place: each list is fresh from the chunker
+        (or unpickled from a worker) and owned by this call.
+        """
+        for chunk in chunks:
+            # Extract chunk type from the original ID (e.g., "python_function_1" -> "function")
+            _, sep, rest = chunk.chunk_id.partition('_')
+            chunk_type = rest.partition('_')[0] if sep else 'unknown'
+            chunk.chunk_id = self.generate_unique_chunk_id(file_path, chunk_type)
+            # Chunks from pool workers arrive with un-interned strings
+            chunk.language = sys.intern(chunk.language)
+        return chunks
     
-    def process_folder(self, folder_path: str, file_extensions: Optional[List[str]] = None) -> List[Dict]:
-        """Process all files in a folder and its subfolders."""
-        if not os.path.exists(folder_path):
-            print(f"❌ Error: The folder '{folder_path}' does not exist.")
-            return []
-            
+    def _collect_files(self, folder_path: str, file_extensions: Optional[List[str]]) -> List[str]:
         # Find all files in the folder
         file_paths = find_files(folder_path)
         
         # Filter by extensions if specified
         if file_extensions:
-            file_paths = [f for f in file_paths if any(f.lower().endswith(ext.lower()) for ext in file_extensions)]
+            ext_tuple = tuple(ext.lower() for ext in file_extensions)
+            file_paths = [f for f in file_paths if f.lower().endswith(ext_tuple)]
         
         print(f"Found {len(file_paths)} files to process in '{folder_path}'")
+        return file_paths
+
+    def process_folder(self, folder_path: str, file_extensions: Optional[List[str]] = None) -> List[CodeChunk]:
+        """Process all files in a folder and its subfolders."""
+        if not os.path.exists(folder_path):
+            print(f"❌ Error: The folder '{folder_path}' does not exist.")
+            return []
+            
+        file_paths = self._collect_files(folder_path, file_extensions)
         
         # Process each file
         self.all_chunks = []
         self.global_chunk_counter = 0
+        self._process_files(file_paths)
         
-        for file_path in file_paths:
-            print(f"Processing: {file_path}")
-            file_chunks = self.process_single_file(file_path)
-            self.all_chunks.extend(file_chunks)
-            print(f"  - Extracted {len(file_chunks)} chunks")
-        
-        print(f"Total chunks extracted: {len(self.all_chunks)}")
+        self._print_summary(len(file_paths))
+        return self.all_chunks
+
+    def _print_summary(self, file_count: int) -> None:
+        # One line per folder; per-file detail is logged at DEBUG
+        with_chunks = len({chunk.file_path for chunk in self.all_chunks})
+        print(f"Total chunks extracted: {len(self.all_chunks)} "
+              f"({with_chunks} of {file_count} files produced chunks)")
+
+    def _process_files(self, file_paths: List[str]) -> None:
+        """Parse file_paths in this process, appending to all_chunks."""
+        # Reads run ahead on a thread pool while this thread parses, in file order
+        with ThreadPoolExecutor(max_workers=READ_AHEAD_THREADS) as readers:
+            upcoming = iter(file_paths)
+            reads = deque((path, readers.submit(_read_source, path))
+                          for path in itertools.islice(upcoming, READ_AHEAD))
+            while reads:
+                file_path, source = reads.popleft()
+                for path in itertools.islice(upcoming, 1):
+                    reads.append((path, readers.submit(_read_source, path)))
+                file_chunks = self.process_single_file(file_path, source)
+                self.all_chunks.extend(file_chunks)
+                logger.debug("Extracted %d chunks from %s", len(file_chunks), file_path)
+
+    def process_folder_parallel(self, folder_path: str, workers: Optional[int] = None,
+                                file_extensions: Optional[List[str]] = None) -> List[CodeChunk]:
+        """Like process_folder, but parses files across a process pool.
+
+        Chunk IDs are assigned here in file order, so the result matches process_folder.
+        """
+        if not os.path.exists(folder_path):
+            print(f"❌ Error: The folder '{folder_path}' does not exist.")
+            return []
+
+        file_paths = self._collect_files(folder_path, file_extensions)
+
+        self.all_chunks = []
+        self.global_chunk_counter = 0
+
+        workers = min(workers or os.cpu_count() or 1, len(file_paths))
+        if workers <= 1 or len(file_paths) < PARALLEL_MIN_FILES:
+            # Starting spawned workers costs more than parsing a few files
+            self._process_files(file_paths)
+            self._print_summary(len(file_paths))
+            return self.all_chunks
+
+        # Spawn rather than fork: the Flask backend calls this from a worker thread,
+        # and forking a multithreaded process can copy held locks into the children.
+        # Each worker builds its parsers (and libclang index) once in _init_worker.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(self.chunk_cache_dir, self.top_level_only)) as ex:
+            for file_path, file_chunks in zip(file_paths, ex.map(_parse_in_worker, file_paths, chunksize=16)):
+                self.all_chunks.extend(self.assign_chunk_ids(file_path, file_chunks))
+                logger.debug("Extracted %d chunks from %s", len(file_chunks), file_path)
+
+        self._print_summary(len(file_paths))
         return self.all_chunks
     
-    def save_chunks_to_file(self, output_path: str) -> None:
-        """Save all chunks to a file in a structured format."""
-        import json        
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(self.all_chunks, f, indent=2)
+    def save_chunks_to_file(self, output_path: str, chunks: Optional[Iterable[CodeChunk]] = None) -> None:
+        """Save chunks to a file as newline-delimited JSON, one chunk per line.
+
+        chunks defaults to all_chunks; any iterable works, so a generator is
+        written as it is produced without being held in memory.
+        """
+        saved = 0
+        with open(output_path, 'wb') as f:
+            for chunk in self.all_chunks if chunks is None else chunks:
+                f.write(orjson.dumps(chunk))
+                f.write(b'\n')
+                saved += 1
         
-        print(f"Saved {len(self.all_chunks)} chunks to {output_path}")
+        print(f"Saved {saved} chunks to {output_path}")
@@ -1,28 +1,82 @@
 import os
+import threading
 
 BLOCKED_DIRS = {'.git', '__pycache__', 'node_modules', '.venv'}
-def is_valid_dir(path):
-    path_parts = path.split(os.sep)
-    return not any(part in BLOCKED_DIRS for part in path_parts)
-
 
 CODE_EXTENSIONS = [".c", ".cpp", ".h", ".hpp", ".java", ".py",".rb", ".rs", ".go", ".js", ".ts", ".cs", ".swift", ".kt", ".m", ".php"]
-def valid_extension(path):
-    if any(path.endswith(ext) for ext in CODE_EXTENSIONS) :
-        return path
+# For one str.endswith call per file name, matched case-insensitively
+EXT_TUPLE = tuple(CODE_EXTENSIONS)
+
+# Directory reads overlap across this many threads; on network filesystems
+# each readdir is a round trip, so it pays to have many in flight.
+WALK_THREADS = 32
 
-def filter_path(path):
-    dir_path = os.path.dirname(path)
-    return(
-        is_valid_dir(dir_path) and
-        valid_extension(path)
-    )
+def _scan_dir(dir_path):
+    """Matching file paths and subdirectories to descend into, in scandir order.
+
+    Classifies entries the way os.walk does: symlinks to directories are
+    neither walked nor collected, everything else that is not a directory is
+    a file. Blocked directories are not descended into at all.
+    """
+    files, subdirs = [], []
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if entry.name not in BLOCKED_DIRS and not entry.is_symlink():
+                        subdirs.append(os.path.join(dir_path, entry.name))
+                elif entry.name.lower().endswith(EXT_TUPLE):
+                    files.append(os.path.join(dir_path, entry.name))
+    except OSError:
+        # Unreadable directories are skipped, as os.walk does by default
+        pass
+    return files, subdirs
 
 def find_files(root_path) :
+    """Code files under root_path, in the same order os.walk would list them.
+
+    Directories are read by WALK_THREADS worker threads taking work from a
+    LIFO stack; the results are stitched back together in walk order so chunk
+    IDs derived from it stay stable between runs.
+    """
+    # Blocked directories below the root are pruned as they are found
+    if any(part in BLOCKED_DIRS for part in root_path.split(os.sep)):
+        return []
+
+    scanned = {}
+    pending = [root_path]
+    state = {'tasks': 1}
+    cond = threading.Condition()
+
+    def worker():
+        while True:
+            with cond:
+                while not pending and state['tasks']:
+                    cond.wait()
+                if not pending:
+                    return
+                dir_path = pending.pop()
+            result = _scan_dir(dir_path)
+            with cond:
+                scanned[dir_path] = result
+                pending.extend(result[1])
+                state['tasks'] += len(result[1]) - 1
+                cond.notify_all()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(WALK_THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
     file_paths = []
-    for (dirpath, dirnames, filenames) in os.walk(root_path) :
-        for file in filenames:
-            file_path = os.path.join(dirpath, file)
-            if filter_path(file_path):
-                file_paths.append(file_path)
-    return file_paths
\ No newline at end of file
+    stack = [root_path]
+    while stack:
+        files, subdirs = scanned[stack.pop()]
+        file_paths.extend(files)
+        stack.extend(reversed(subdirs))
+    return file_paths
@@ -0,0 +1,18 @@
+# Production entry point:
+#
+#   gunicorn -k gthread -w 1 --threads 8 -b 0.0.0.0:5000 wsgi:application
+#
+# Keep a single worker: the jobs table, engine cache and embedding model live
+# in-process, and /job_status must be answered by the process that owns the
+# job. Threads give request concurrency instead; encode() and Chroma spend
+# their time in native code that releases the GIL. Keep --threads in step with
+# SearchEngine.SEARCH_POOL_THREADS, which gives each request thread one search
+# helper. gevent is not used because its monkeypatching would turn the
+# ingestion executor's threads into greenlets that block on CPU work.
+#
+# On Windows, where gunicorn is unavailable:
+#
+#   waitress-serve --threads=8 --port=5000 wsgi:application
+from app import create_app
+
+application = create_app()
@@ -41,6 +41,16 @@ function App() {
       );
 
       setMessage(response.data.message);
+
+      // Processing runs as a background job; poll until it settles.
+      let job = { status: "running" };
+      while (job.status === "running") {
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        const status = await axios.get(`http://127.0.0.1:5000/job_status/${response.data.job_id}`);
+        job = status.data;
+      }
+      setMessage(job.message);
+
       const updated = await axios.get("http://127.0.0.1:5000/get_projects");
       setProjects(updated.data.projects);
     } catch (error) {